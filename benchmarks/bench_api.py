@@ -0,0 +1,155 @@
+""" End-to-end benchmark of providers against the fake GitHub API, the per-item cost
+of parsers, decoding by workers and the rendering of tables
+
+Results are saved to a JSON file, the next run compares its timings with the saved
+ones and marks the slower by more than the threshold.
+Run: `python -m benchmarks.bench_api [--pages 10] [--latency 0.01] [--output FILE]`
+"""
+import argparse
+import asyncio
+import json
+import time
+import timeit
+from pathlib import Path
+from typing import Callable, Dict
+
+from git_watcher.config import base_parser
+from git_watcher.display import Table
+from git_watcher.objects import Contributor, ItemStates, Statistic
+from git_watcher.source import GitHub
+from git_watcher.source.decode import decode_page
+
+from .fake_github import FakeGitHub
+
+RESULTS = Path(__file__).with_name('results.json')
+
+
+async def timed(func: Callable) -> float:
+    start = time.perf_counter()
+    await func()
+    return time.perf_counter() - start
+
+
+async def bench_updates(pages: int, latency: float) -> Dict[str, float]:
+    """ Seconds of `update_*` by cold cache, warm cache (304) and without the `last` page
+    """
+    results = {}
+    for name, link_last in (('', True), (' sequential', False)):
+        fake = FakeGitHub(pages=pages, latency=latency, link_last=link_last)
+        base_url = await fake.start()
+        config = base_parser(['https://github.com/owner/repo', '--no-debug'])
+        provider = GitHub(config)
+        provider.base_url = base_url
+        try:
+            for update in ('update_contributors', 'update_pulls_info', 'update_issues_info'):
+                method = getattr(provider, update)
+                results[f'{update} cold{name}'] = await timed(method)
+                if link_last:
+                    results[f'{update} warm'] = await timed(method)
+        finally:
+            await provider.close()
+            await fake.close()
+    return results
+
+
+async def bench_parse_workers(pages: int) -> Dict[str, float]:
+    """ Seconds of the cold `update_contributors` by decoding on the loop and by workers,
+    the pages are large and served without latency, so the parsing is the bottleneck
+    """
+    results = {}
+    for name, args in (('loop', []),
+                       ('2 threads', ['--parse-workers', '2']),
+                       ('2 processes', ['--parse-workers', '2', '--parse-executor', 'process'])):
+        fake = FakeGitHub(pages=pages, per_page=1000, not_modified=False)
+        base_url = await fake.start()
+        config = base_parser(['https://github.com/owner/repo', '--no-debug', *args])
+        provider = GitHub(config)
+        provider.base_url = base_url
+        try:
+            results[f'parse by {name}'] = await timed(provider.update_contributors)
+        finally:
+            await provider.close()
+            await fake.close()
+    return results
+
+
+async def bench_all(pages: int, latency: float) -> Dict[str, float]:
+    results = await bench_updates(pages, latency)
+    results.update(await bench_parse_workers(pages))
+    return results
+
+
+def bench_items(number: int = 20) -> Dict[str, float]:
+    """ Microseconds of parsers by one item of a decoded page
+    """
+    fake = FakeGitHub(pages=1)
+    config = base_parser(['https://github.com/owner/repo', '--no-debug'])
+    provider = GitHub(config)
+    commits = decode_page(fake.data['commits'][0], GitHub.commit_fields)
+    pulls = decode_page(fake.data['pulls'][0], GitHub.item_fields)
+
+    def parse():
+        list(provider.parse_contributors(commits, provider.new_contributors()))
+
+    def count():
+        states = ItemStates()
+        provider.apply_items(states, pulls, k_filter=lambda pr: pr['draft'])
+        states.counts(provider.edge(provider.pr_edge_days))
+
+    return {
+        'parse_contributors per item': timeit.timeit(parse, number=number)
+        / number / len(commits) * 1e6,
+        'apply_items per item': timeit.timeit(count, number=number)
+        / number / len(pulls) * 1e6,
+    }
+
+
+def bench_tables(number: int = 200) -> Dict[str, float]:
+    """ Microseconds of rendering the tables of dashboard
+    """
+    top = [Contributor(f'user{i}', count=1000 - i, email=f'user{i}@mail.com')
+           for i in range(30)]
+    statistic = [{'name': 'Pulls', 'opened': 10, 'closed': 200, 'old_opened': 3},
+                 {'name': 'Issues', 'opened': 40, 'closed': 900, 'old_opened': 12}]
+    return {
+        'Table of top': timeit.timeit(lambda: str(Table(Contributor, top)),
+                                      number=number) / number * 1e6,
+        'Table of statistic': timeit.timeit(lambda: str(Table(Statistic, statistic)),
+                                            number=number) / number * 1e6,
+    }
+
+
+def report(results: Dict[str, float], previous: Dict[str, float], threshold: float):
+    print(f'{"":40}{"now":>12}{"saved":>12}')
+    for name, value in results.items():
+        saved = previous.get(name)
+        mark = ''
+        if saved and value > saved * (1 + threshold):
+            mark = '  regression'
+        saved_text = f'{saved:>12.4f}' if saved else f'{"-":>12}'
+        print(f'{name:40}{value:>12.4f}{saved_text}{mark}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', default=10, type=int, help='pages of each listing')
+    parser.add_argument('--latency', default=0.01, type=float, help='delay of each page')
+    parser.add_argument('--threshold', default=0.2, type=float,
+                        help='part of slowdown which is marked as regression')
+    parser.add_argument('--output', default=str(RESULTS), help='file of saved results')
+    args = parser.parse_args()
+
+    results = asyncio.run(bench_all(args.pages, args.latency))
+    results.update(bench_items())
+    results.update(bench_tables())
+
+    output = Path(args.output)
+    previous = json.loads(output.read_text()) if output.exists() else {}
+    print(f'{args.pages} pages of 100 items, latency {args.latency}s; '
+          f'update_* in s, items and tables in µs')
+    report(results, previous, args.threshold)
+    output.write_text(json.dumps(results, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Memory of contributors storage: the former dataclass against the slotted record
+
+Run: `python -m benchmarks.bench_contributors`
+"""
+import json
+import tracemalloc
+from dataclasses import dataclass
+
+from git_watcher.objects import Contributor
+
+
+@dataclass(unsafe_hash=True)
+class DataclassContributor:
+    login: str
+    count: int = 0
+    email: str = ''
+
+
+def build(cls, pages):
+    storage = {}
+    for page in pages:
+        for item in json.loads(page):
+            login = item['login']
+            if login not in storage:
+                storage[login] = cls(login=login, email=item['email'], count=1)
+            else:
+                storage[login].count += 1
+    return storage
+
+
+def measure(cls, pages):
+    tracemalloc.start()
+    storage = build(cls, pages)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del storage
+    return current
+
+
+def main(authors=50000, pages=5):
+    # each author appears on every page, like commits of one author over the history
+    items = [{'login': f'user-{i}', 'email': f'user-{i}@mail.com'} for i in range(authors)]
+    raw = [json.dumps(items) for _ in range(pages)]
+    print(f'{authors} contributors from {pages} pages')
+    for name, cls in (('dataclass', DataclassContributor), ('slotted', Contributor)):
+        print(f'{name:12}{measure(cls, raw) / 2 ** 20:>8.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+""" Micro-benchmark of decoding and parsing one page of commits
+
+Compares the full decode with `strptime` dates against the decode with projection
+of fields and `parse_iso`. Run: `python -m benchmarks.bench_parse`
+"""
+import json
+import timeit
+import tracemalloc
+from datetime import datetime
+
+from git_watcher.source.decode import decode_page, parse_iso
+from git_watcher.source.github import GitHub
+
+
+def user(i):
+    login = f'user{i}'
+    api = f'https://api.github.com/users/{login}'
+    return {
+        'login': login, 'id': i, 'node_id': f'MDQ6VXNlcj{i:08d}',
+        'avatar_url': f'https://avatars.githubusercontent.com/u/{i}?v=4',
+        'gravatar_id': '', 'url': api, 'html_url': f'https://github.com/{login}',
+        'followers_url': f'{api}/followers',
+        'following_url': f'{api}/following{{/other_user}}',
+        'gists_url': f'{api}/gists{{/gist_id}}',
+        'starred_url': f'{api}/starred{{/owner}}{{/repo}}',
+        'subscriptions_url': f'{api}/subscriptions',
+        'organizations_url': f'{api}/orgs', 'repos_url': f'{api}/repos',
+        'events_url': f'{api}/events{{/privacy}}',
+        'received_events_url': f'{api}/received_events',
+        'type': 'User', 'site_admin': False,
+    }
+
+
+def commit(i):
+    sha = f'{i:040x}'
+    repo = 'https://api.github.com/repos/owner/repo'
+    date = f'2020-02-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:00Z'
+    git_user = {'name': f'User {i % 50}', 'email': f'user{i % 50}@mail.com', 'date': date}
+    return {
+        'sha': sha, 'node_id': f'MDY6Q29tbWl0{sha}',
+        'commit': {
+            'author': git_user, 'committer': git_user,
+            'message': f'Commit message number {i}\n\n' + 'Long description. ' * 10,
+            'tree': {'sha': sha, 'url': f'{repo}/git/trees/{sha}'},
+            'url': f'{repo}/git/commits/{sha}', 'comment_count': 0,
+            'verification': {'verified': False, 'reason': 'unsigned',
+                             'signature': None, 'payload': None},
+        },
+        'url': f'{repo}/commits/{sha}', 'html_url': f'https://github.com/owner/repo/commit/{sha}',
+        'comments_url': f'{repo}/commits/{sha}/comments',
+        'author': user(i % 50), 'committer': user(i % 50),
+        'parents': [{'sha': sha, 'url': f'{repo}/commits/{sha}',
+                     'html_url': f'https://github.com/owner/repo/commit/{sha}'}],
+    }
+
+
+def parse_old(body):
+    data = json.loads(body)
+    counts = {}
+    for item in data:
+        git_author = item['commit']['author']
+        login = (item.get('author') or {}).get('login') or git_author['email']
+        datetime.strptime(git_author['date'], '%Y-%m-%dT%H:%M:%S%z')
+        counts[login] = counts.get(login, 0) + 1
+    return data
+
+
+def parse_new(body):
+    data = decode_page(body, GitHub.commit_fields)
+    counts = {}
+    for item in data:
+        git_author = item['commit']['author']
+        login = (item.get('author') or {}).get('login') or git_author['email']
+        parse_iso(git_author['date'])
+        counts[login] = counts.get(login, 0) + 1
+    return data
+
+
+def peak_memory(func, body, pages=10):
+    """ Peak of memory while pages are decoded and kept, like the cache does
+    """
+    tracemalloc.start()
+    kept = [func(body) for _ in range(pages)]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return peak
+
+
+def main(number=200):
+    body = json.dumps([commit(i) for i in range(100)]).encode()
+    print(f'page of 100 commits, {len(body) / 1024:.0f} KB')
+    print(f'{"":12}{"ms/page":>10}{"peak KB/10 pages":>20}')
+    for name, func in (('full', parse_old), ('projected', parse_new)):
+        sec = timeit.timeit(lambda: func(body), number=number) / number
+        peak = peak_memory(func, body)
+        print(f'{name:12}{sec * 1000:>10.3f}{peak / 1024:>20.0f}')
+
+
+if __name__ == '__main__':
+    main()
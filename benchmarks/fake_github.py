@@ -0,0 +1,142 @@
+""" In-process fake of GitHub REST API with synthetic commits, pulls and issues
+
+Pages are served with `Link`, `ETag` and `X-RateLimit-*` headers like the real API,
+a request with the known `If-None-Match` gets 304. Used by `benchmarks.bench_api`.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as tz
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+START = datetime(2020, 1, 1, tzinfo=tz.utc)
+
+
+def commit(i: int, authors: int) -> Dict:
+    date = (START + timedelta(minutes=i)).isoformat().replace('+00:00', 'Z')
+    author = i % authors
+    git_user = {'name': f'User {author}', 'email': f'user{author}@mail.com', 'date': date}
+    return {
+        'sha': f'{i:040x}',
+        'commit': {'author': git_user, 'committer': git_user,
+                   'message': f'Commit message number {i}'},
+        # every tenth author has no account on GitHub
+        'author': None if author % 10 == 0 else {'login': f'user{author}', 'id': author},
+    }
+
+
+def item(i: int, pull: bool = False) -> Dict:
+    created = START + timedelta(hours=i)
+    data = {
+        'number': i,
+        'state': 'open' if i % 3 == 0 else 'closed',
+        'created_at': created.isoformat().replace('+00:00', 'Z'),
+        'updated_at': (created + timedelta(days=1)).isoformat().replace('+00:00', 'Z'),
+        'title': f'Item number {i}',
+        'draft': pull and i % 7 == 0,
+    }
+    if not pull and i % 4 == 0:
+        data['pull_request'] = {'url': f'https://api.github.com/pulls/{i}'}
+    return data
+
+
+@dataclass
+class FakeGitHub:
+    """ Fake of API for one repository
+
+    :pages int: count of pages of each listing
+    :latency float: delay in second before each response
+    :link_last bool: give the `last` relation in `Link`, else pages go one by one
+    :rate_limit int: quota of requests in `X-RateLimit-*` headers, 0 for no headers
+    :not_modified bool: answer 304 for a page with the known `ETag`
+    """
+    pages: int = 10
+    per_page: int = 100
+    latency: float = 0.0
+    link_last: bool = True
+    rate_limit: int = 10 ** 6
+    not_modified: bool = True
+    authors: int = 50
+    requests: int = 0
+    responses: Dict[int, int] = field(default_factory=dict)
+    data: Dict[str, List[bytes]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        size = self.per_page
+        self.data = {
+            'commits': [json.dumps([commit(p * size + i, self.authors) for i in range(size)])
+                        .encode() for p in range(self.pages)],
+            'pulls': [json.dumps([item(p * size + i, pull=True) for i in range(size)])
+                      .encode() for p in range(self.pages)],
+            'issues': [json.dumps([item(p * size + i) for i in range(size)])
+                       .encode() for p in range(self.pages)],
+        }
+        self.app = web.Application()
+        self.app.router.add_get('/repos/{owner}/{repo}', self.repository)
+        self.app.router.add_get('/repos/{owner}/{repo}/compare/{range}', self.compare)
+        self.app.router.add_get('/repos/{owner}/{repo}/{kind:commits|pulls|issues}', self.listing)
+
+    def headers(self) -> Dict[str, str]:
+        if not self.rate_limit:
+            return {}
+        self.requests += 1
+        return {'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(max(self.rate_limit - self.requests, 1)),
+                'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+
+    def respond(self, status: int, **kwargs) -> web.Response:
+        self.responses[status] = self.responses.get(status, 0) + 1
+        return web.Response(status=status, **kwargs)
+
+    async def repository(self, request: web.Request) -> web.Response:
+        # the branch of benchmarks is not default, so the commits are counted page by page
+        body = json.dumps({'default_branch': 'main'}).encode()
+        return self.respond(200, body=body, headers=self.headers(),
+                            content_type='application/json')
+
+    async def compare(self, request: web.Request) -> web.Response:
+        body = json.dumps({'status': 'ahead'}).encode()
+        return self.respond(200, body=body, headers=self.headers(),
+                            content_type='application/json')
+
+    def links(self, request: web.Request, page: int) -> str:
+        query = {k: v for k, v in request.query.items() if k != 'page'}
+        base = str(request.url.with_query(query))
+        relations: List[Tuple[int, str]] = []
+        if page < self.pages:
+            relations.append((page + 1, 'next'))
+            if self.link_last:
+                relations.append((self.pages, 'last'))
+        if page > 1:
+            relations += [(page - 1, 'prev'), (1, 'first')]
+        return ', '.join(f'<{base}&page={n}>; rel="{name}"' for n, name in relations)
+
+    async def listing(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        page = int(request.query.get('page', 1))
+        kind = request.match_info['kind']
+        etag = f'"{kind}-{page}"'
+        headers = {**self.headers(), 'ETag': etag, 'Link': self.links(request, page)}
+        if self.not_modified and request.headers.get('If-None-Match') == etag:
+            return self.respond(304, headers=headers)
+
+        pages = self.data[kind]
+        body = pages[page - 1] if page <= len(pages) else b'[]'
+        return self.respond(200, body=body, headers=headers, content_type='application/json')
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """ Serve on a free port, the base url of API is returned
+        """
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return f'http://{host}:{port}/'
+
+    async def close(self):
+        await self.runner.cleanup()
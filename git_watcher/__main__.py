@@ -1,11 +1,12 @@
-import asyncio
 import logging
 
 from git_watcher import logger
 from git_watcher.config import base_parser
-from git_watcher.watcher import Watcher
 
 config = base_parser()
+# after parsing, so `--help` and bad arguments do not wait for asyncio and aiohttp
+import asyncio  # noqa: E402
+from git_watcher.watcher import Watcher  # noqa: E402
 
 if not config.debug:
     logger.propagate = False
@@ -1,8 +1,12 @@
 import argparse
+import os
 from datetime import datetime, timezone as tz
 from numbers import Number
+from pathlib import Path
+from typing import Optional, Sequence
 
 from .objects import Destination
+from .source import PROVIDERS
 
 
 def parse_date(v):
@@ -14,10 +18,29 @@ def parse_date(v):
         return datetime.fromisoformat(v).replace(microsecond=0, tzinfo=tz.utc)
 
 
-def base_parser():
+def base_parser(argv: Optional[Sequence[str]] = None):
     parser = argparse.ArgumentParser(prog='git_wathcer',
                                      description='Simple dashboard of git repository')
-    parser.add_argument('dest', type=Destination.from_str, metavar='URL', help='Repository URL')
+    parser.add_argument('dest', type=Destination.from_str, metavar='URL', nargs='*',
+                        help='Repository URL, can be repeated for watch many repositories')
+    parser.add_argument('--repos-file', default='', type=str,
+                        help='file with repository URLs, one by line [%(default)s].')
+    parser.add_argument('--parallel-repos', default=4, type=int,
+                        help='max count of repositories refreshed at the same time '
+                             '[%(default)s].')
+    parser.add_argument('--page-size', default=10, type=int,
+                        help='count of repositories in one page of statistic [%(default)s].')
+    parser.add_argument('--provider', default='github', choices=tuple(PROVIDERS),
+                        help='API for load data, REST or GraphQL, or local clone for '
+                             'commits [%(default)s].')
+    parser.add_argument('--contributors-source', default='commits', choices=('commits', 'stats'),
+                        help='source of contributors of the REST API: every commit, or the '
+                             'weekly statistic of GitHub, which takes few requests but only '
+                             'for the default branch and a window of whole weeks, and skips '
+                             'authors without GitHub account [%(default)s].')
+    parser.add_argument('--mirror', default='', type=str,
+                        help='path of local clone of the repository for the local provider '
+                             '[%(default)s].')
     parser.add_argument('--branch', type=str, default='master', required=False,
                         help='branch name for analyze commits [%(default)s].')
     parser.add_argument('--since', type=parse_date, default=None, required=False,
@@ -31,9 +54,88 @@ def base_parser():
     parser.add_argument('--auth', default='', type=str,
                         help='authenticate for pass or just get more rate limit.\n'
                              'Example: `<login>:<pass>` or `<clent_id>:<clent_secret>`')
+    parser.add_argument('--auth-file', default='', type=str,
+                        help='file of credentials `login:token` by line, the requests go by '
+                             'the credential with the most rest of quota, also from '
+                             'comma separated GIT_WATCHER_AUTH.')
     parser.add_argument('--update-interval', default=600, type=int,
                         help='period in second between repeat upload data [%(default)s].')
+    parser.add_argument('--pulls-interval', default=None, type=int,
+                        help='period in second between updates of pull requests, '
+                             'by default the update interval [%(default)s].')
+    parser.add_argument('--issues-interval', default=None, type=int,
+                        help='period in second between updates of issues, '
+                             'by default the update interval [%(default)s].')
+    parser.add_argument('--contributors-interval', default=None, type=int,
+                        help='period in second between updates of contributors, '
+                             'by default the update interval [%(default)s].')
+    parser.add_argument('--update-jitter', default=0.1, type=float,
+                        help='part of interval added randomly to each period [%(default)s].')
     parser.add_argument('--size-top-table', default=30, type=int,
                         help='size table of top contributors [%(default)s].')
-    args, _ = parser.parse_known_args()
+    parser.add_argument('--concurrency', default=4, type=int,
+                        help='max count of pages requested at the same time [%(default)s].')
+    parser.add_argument('--pool-size', default=10, type=int,
+                        help='max count of open connections to API [%(default)s].')
+    parser.add_argument('--pool-size-per-host', default=0, type=int,
+                        help='max count of open connections to one host, 0 is no limit '
+                             '[%(default)s].')
+    parser.add_argument('--dns-cache-ttl', default=300, type=int,
+                        help='period in second of caching resolved hosts [%(default)s].')
+    parser.add_argument('--request-timeout', default=60, type=int,
+                        help='timeout in second of one request [%(default)s].')
+    parser.add_argument('--cache-file', default='', type=str,
+                        help='file for keep the cache of responses between restarts, '
+                             'empty for keep in memory only [%(default)s].')
+    parser.add_argument('--cache-size', default=64, type=int,
+                        help='max size of the cache of responses in MB [%(default)s].')
+    parser.add_argument('--parse-workers', default=0, type=int,
+                        help='count of workers for decoding of large pages out of the loop, '
+                             '0 for decode on the loop [%(default)s].')
+    parser.add_argument('--parse-executor', default='thread', choices=('thread', 'process'),
+                        help='kind of workers for decoding [%(default)s].')
+    parser.add_argument('--state-file', default='', type=str,
+                        help='sqlite file for keep the counted data between restarts, '
+                             'empty for disable [%(default)s].')
+    parser.add_argument('--http-port', default=0, type=int,
+                        help='port of HTTP server for webhooks, metrics and snapshots, '
+                             '0 for disable [%(default)s].')
+    parser.add_argument('--http-host', default='127.0.0.1', type=str,
+                        help='host of HTTP server [%(default)s].')
+    parser.add_argument('--webhooks', default=False, action='store_true',
+                        help='receive webhooks of GitHub on /webhook of HTTP server.')
+    parser.add_argument('--webhook-secret', type=str,
+                        default=os.environ.get('GIT_WATCHER_WEBHOOK_SECRET', ''),
+                        help='secret of webhooks for verify signatures, '
+                             'also from GIT_WATCHER_WEBHOOK_SECRET.')
+    parser.add_argument('--reconcile-interval', default=3600, type=int,
+                        help='period in second of polls while webhooks are received, '
+                             'unless the interval of metric is given [%(default)s].')
+    parser.add_argument('--metrics', default=False, action='store_true',
+                        help='collect runtime metrics, served on /metrics (Prometheus) '
+                             'and /metrics.json of HTTP server.')
+    parser.add_argument('--serve', default=False, action='store_true',
+                        help='serve the top contributors and statistic in JSON on /snapshot '
+                             'of HTTP server for other consumers.')
+    parser.add_argument('--window-token', type=str,
+                        default=os.environ.get('GIT_WATCHER_WINDOW_TOKEN', ''),
+                        help='token of `PUT /window` of HTTP server for change the window '
+                             'at runtime by `Authorization: Bearer <token>`, also from '
+                             'GIT_WATCHER_WINDOW_TOKEN, empty for disable.')
+    args, _ = parser.parse_known_args(argv)
+    served = [f'--{name}' for name in ('webhooks', 'metrics', 'serve') if getattr(args, name)]
+    if served and not args.http_port:
+        parser.error(f'{", ".join(served)}: the HTTP server is off without --http-port')
+    if args.webhooks and not args.webhook_secret:
+        parser.error('--webhooks requires --webhook-secret or GIT_WATCHER_WEBHOOK_SECRET, '
+                     'unsigned events are not accepted')
+
+    args.dests = list(args.dest)
+    if args.repos_file:
+        lines = Path(args.repos_file).read_text().splitlines()
+        args.dests += [Destination.from_str(line.strip()) for line in lines
+                       if line.strip() and not line.startswith('#')]
+    if not args.dests:
+        parser.error('at least one repository URL is required')
+    args.dest = args.dests[0]
     return args
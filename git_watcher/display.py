@@ -1,24 +1,23 @@
+import logging
 import os
+import shutil
+import sys
 from dataclasses import asdict, is_dataclass
 from itertools import cycle
-from typing import List, Dict
+from typing import List, Dict, Callable, Hashable, Tuple, TextIO, Optional
 
 from . import logger
 
-__all__ = ('clear_output', 'Throbber', 'Table')
+__all__ = ('snapshot', 'Throbber', 'Table', 'Renderer')
 
 
-def clear_output():
+def snapshot(text: str):
+    """ Rewrite the output files of the logger with the current dashboard
+    """
+    record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, text, (), None)
     for h in logger.handlers:
         h.close()
-
-    term = os.getenv('TERM')
-    if not term:
-        return
-    if os.name == 'nt':
-        os.system('cls')
-    else:
-        os.system('clear')
+        h.handle(record)
 
 
 class Throbber:
@@ -40,6 +39,8 @@ class Table:
         for i, item in enumerate(data, start=1):
             if is_dataclass(item):
                 item = asdict(item)
+            elif not isinstance(item, dict):
+                item = item.asdict()
             item['id'] = str(i)
 
             row: List[str] = []
@@ -63,3 +64,98 @@ class Table:
                 cell.ljust(sizes[i]) for i, cell in enumerate(row)
             ))
         return '\n'.join(resp)
+
+
+class LastRecord(logging.Handler):
+    """ Keep the first line of the last record for drawing it inside of the frame
+    """
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.line = ''
+
+    def emit(self, record: logging.LogRecord):
+        lines = self.format(record).splitlines()
+        self.line = lines[0] if lines else ''
+
+
+class Renderer:
+    """ Draw frames of the dashboard in the terminal, only changed lines are redrawn
+    by ANSI cursor moves and rendered parts are cached by the version of their data
+
+    Without a terminal a frame is written in full and only when it changed.
+    Console handlers of logs would scroll the drawn lines, so `capture_logs` takes them
+    off the root logger and the last record is drawn below the status line.
+    """
+    CLEAR = '\x1b[2J'
+    HIDE_CURSOR = '\x1b[?25l'
+    SHOW_CURSOR = '\x1b[?25h'
+
+    def __init__(self, stream: Optional[TextIO] = None, ansi: Optional[bool] = None):
+        self.stream = stream or sys.stdout
+        self.ansi = bool(os.getenv('TERM')) if ansi is None else ansi
+        self.lines: List[str] = []
+        self.parts: Dict[str, Tuple[Hashable, str]] = {}
+        self.detached: List[logging.Handler] = []
+        self.last_record: Optional[LastRecord] = None
+
+    def capture_logs(self):
+        if not self.ansi or self.last_record is not None:
+            return
+        root = logging.getLogger()
+        self.detached = [h for h in root.handlers if isinstance(h, logging.StreamHandler)
+                         and not isinstance(h, logging.FileHandler)]
+        if not self.detached:
+            return
+        self.last_record = LastRecord(min(h.level for h in self.detached))
+        self.last_record.setFormatter(self.detached[0].formatter)
+        for h in self.detached:
+            root.removeHandler(h)
+        root.addHandler(self.last_record)
+
+    def cached(self, name: str, version: Hashable, render: Callable[[], str]) -> str:
+        """ Render the part again only on a new version of its data
+        """
+        cached = self.parts.get(name)
+        if cached is None or cached[0] != version:
+            cached = self.parts[name] = (version, render())
+        return cached[1]
+
+    def draw(self, lines: List[str], status: str = ''):
+        """ Draw the lines and the status line below them, the status can change
+        on each frame, e.g. for a throbber
+        """
+        frame = lines + [status]
+        if self.last_record is not None:
+            # a wrapped line would shift the next frame
+            frame.append(self.last_record.line[:shutil.get_terminal_size().columns])
+        if not self.ansi:
+            if lines != self.lines[:-1]:
+                self.stream.write('\n'.join(lines) + '\n')
+                self.stream.flush()
+            self.lines = frame
+            return
+
+        out = [] if self.lines else [self.HIDE_CURSOR, self.CLEAR]
+        for i, line in enumerate(frame):
+            if i >= len(self.lines) or self.lines[i] != line:
+                out.append(f'\x1b[{i + 1};1H{line}\x1b[K')
+        if len(frame) < len(self.lines):
+            out.append(f'\x1b[{len(frame) + 1};1H\x1b[J')
+        self.lines = frame
+        if out:
+            self.stream.write(''.join(out))
+            self.stream.flush()
+
+    def close(self):
+        if self.ansi and self.lines:
+            self.stream.write(f'\x1b[{len(self.lines) + 1};1H{self.SHOW_CURSOR}')
+            self.stream.flush()
+        self.lines = []
+        if self.last_record is not None:
+            root = logging.getLogger()
+            root.removeHandler(self.last_record)
+            for h in self.detached:
+                root.addHandler(h)
+            self.detached = []
+            self.last_record = None
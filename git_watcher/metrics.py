@@ -0,0 +1,126 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+__all__ = ('Metrics', 'NullMetrics', 'NULL_METRICS')
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """ Cumulative counts of observations by upper bounds of buckets, like Prometheus
+    """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def buckets(self) -> Iterator[Tuple[str, int]]:
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            yield f'{bound:g}', total
+        yield '+Inf', self.count
+
+
+class Metrics:
+    """ Registry of counters and histograms of seconds labeled by endpoint, reason etc.
+
+    Names follow Prometheus: `*_total` are counters and `*_seconds` are histograms.
+    """
+    enabled = True
+    bounds = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+    prefix = 'git_watcher_'
+
+    def __init__(self):
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+
+    @staticmethod
+    def key(name: str, labels: Dict[str, str]) -> Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self.key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self.key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.bounds)
+        histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def asdict(self) -> Dict[str, List[Dict]]:
+        data: Dict[str, List[Dict]] = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            data.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), h in sorted(self.histograms.items()):
+            data.setdefault(name, []).append({'labels': dict(labels), 'count': h.count,
+                                              'sum': h.sum, 'buckets': dict(h.buckets())})
+        return data
+
+    def prometheus(self) -> str:
+        """ Metrics in the text format of Prometheus
+        """
+        lines = []
+        typed = set()
+
+        def labels_text(labels, **extra):
+            pairs = [*labels, *extra.items()]
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {self.prefix}{name} counter')
+                typed.add(name)
+            lines.append(f'{self.prefix}{name}{labels_text(labels)} {value:g}')
+        for (name, labels), h in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {self.prefix}{name} histogram')
+                typed.add(name)
+            for bound, count in h.buckets():
+                lines.append(f'{self.prefix}{name}_bucket{labels_text(labels, le=bound)} {count}')
+            lines.append(f'{self.prefix}{name}_sum{labels_text(labels)} {h.sum:g}')
+            lines.append(f'{self.prefix}{name}_count{labels_text(labels)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics(Metrics):
+    """ Disabled registry, every record is a no-op
+    """
+    enabled = False
+
+    def inc(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        yield
+
+
+NULL_METRICS = NullMetrics()
@@ -1,22 +1,137 @@
-from dataclasses import dataclass
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from urllib.parse import urlparse
 
 
-@dataclass(unsafe_hash=True)
 class Contributor:
-    login: str
-    count: int = 0
-    email: str = ''
+    """ Record of contributor without instance dict, a storage of contributors
+    is keyed by the same login string as the record so each login is kept once
+    """
+    __slots__ = ('login', 'count', 'email')
+
+    def __init__(self, login: str, count: int = 0, email: str = ''):
+        self.login = login
+        self.count = count
+        self.email = email
 
     @staticmethod
     def columns():
         return ('login', 'count')
 
+    def asdict(self):
+        return {'login': self.login, 'count': self.count, 'email': self.email}
+
+    def __repr__(self):
+        return f'Contributor(login={self.login!r}, count={self.count!r}, email={self.email!r})'
+
     def __eq__(self, other):
         if isinstance(other, str):
             return self.login == other
-        return super().__eq__(other)
+        if isinstance(other, Contributor):
+            return (self.login, self.count, self.email) == (other.login, other.count, other.email)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.login)
+
+
+class TopIndex:
+    """ Contributors with the largest counts ordered by count, it is kept up to date
+    on each increment while counts only grow, so reading the top costs O(size)
+
+    :version int: incremented on each change of the top
+    :moved Set[str]: logins of rows changed since the last `pop_moved`
+    """
+
+    def __init__(self, size: int, contributors: Iterable[Contributor] = ()):
+        self.size = size
+        self.items: List[Contributor] = heapq.nlargest(
+            size, contributors, key=lambda c: c.count)
+        self.logins = {c.login for c in self.items}
+        self.version = 0
+        self.moved = set(self.logins)
+
+    def touch(self, contributor: Contributor):
+        """ Place the contributor after its count was increased
+        """
+        items = self.items
+        if contributor.login in self.logins:
+            i = next(i for i, c in enumerate(items) if c is contributor)
+        elif len(items) < self.size:
+            items.append(contributor)
+            i = len(items) - 1
+        elif items and contributor.count > items[-1].count:
+            self.logins.discard(items[-1].login)
+            self.moved.add(items[-1].login)
+            items[-1] = contributor
+            i = len(items) - 1
+        else:
+            return
+        self.logins.add(contributor.login)
+        self.moved.add(contributor.login)
+
+        while i > 0 and items[i - 1].count < contributor.count:
+            self.moved.add(items[i - 1].login)
+            items[i - 1], items[i] = contributor, items[i - 1]
+            i -= 1
+        self.version += 1
+
+    def pop_moved(self) -> Set[str]:
+        moved, self.moved = self.moved, set()
+        return moved
+
+
+class ContributorStore(Dict[str, Contributor]):
+    """ Contributors by login with the index of top contributors
+    """
+    top: TopIndex
+
+    def __init__(self, size_top: int, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.top = TopIndex(size_top, self.values())
+
+    def add(self, login: str, email: str = '', count: int = 1) -> Optional[Contributor]:
+        """ Increase count of the contributor
+
+        :return: the contributor if it is new
+        """
+        contributor = self.get(login)
+        created = None
+        if contributor is None:
+            contributor = created = Contributor(login=login, email=email)
+            super().__setitem__(login, contributor)
+        contributor.count += count
+        self.top.touch(contributor)
+        return created
+
+    def __setitem__(self, login: str, contributor: Contributor):
+        super().__setitem__(login, contributor)
+        self.reindex()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.reindex()
+
+    def __delitem__(self, login: str):
+        super().__delitem__(login)
+        self.reindex()
+
+    def clear(self):
+        super().clear()
+        self.reindex()
+
+    def reindex(self, size: Optional[int] = None):
+        self.top = TopIndex(size or self.top.size, self.values())
+
+    def top_contributors(self, size: int) -> List[Contributor]:
+        if size != self.top.size:
+            self.reindex(size)
+        return list(self.top.items)
 
 
 @dataclass
@@ -43,3 +158,176 @@ class Destination:
         if len(args) != 2:
             raise ValueError('Incorect repository url')
         return cls(*args)
+
+
+# branch, since and until of counted data
+Window = Tuple[Optional[str], Optional[datetime], Optional[datetime]]
+
+
+@dataclass
+class Watermark:
+    """ The newest commit already counted in the contributors
+
+    :sha str: head of the branch at the last update, the next update compares with it
+    :date datetime: the newest commit date, only a hint: merged commits can be older
+    :seen Set[str]: commits with exactly this date
+    :window Tuple: branch, since and until which the contributors was counted for
+    :pushed Set[str]: commits already counted by push events, the poll skips them
+    """
+    sha: str
+    date: datetime
+    seen: Set[str] = field(default_factory=set)
+    window: Window = ('', None, None)
+    pushed: Set[str] = field(default_factory=set)
+
+    def advance(self, sha: str, date: datetime):
+        if date > self.date:
+            self.date = date
+            self.seen = {sha}
+        elif date == self.date:
+            self.seen.add(sha)
+
+
+class ItemStates:
+    """ State of pull requests or issues by number for incremental counters, the open
+    ones are indexed by time of creation so the old ones are counted for any moment
+
+    :items Dict: number -> (is open, timestamp of creation)
+    :opened List[float]: sorted timestamps of creation of the open items
+    :cursor datetime: the newest `updated_at` of applied items, the next poll starts from it
+    :window Tuple: branch, since and until which the items was counted for
+    """
+    __slots__ = ('items', 'opened', 'closed', 'cursor', 'window')
+
+    def __init__(self, window: Window = ('', None, None)):
+        self.items: Dict[int, Tuple[bool, float]] = {}
+        self.opened: List[float] = []
+        self.closed = 0
+        self.cursor: Optional[datetime] = None
+        self.window = window
+
+    def discard(self, number: int):
+        item = self.items.pop(number, None)
+        if item is None:
+            return
+        is_open, created = item
+        if is_open:
+            del self.opened[bisect_left(self.opened, created)]
+        else:
+            self.closed -= 1
+
+    def set(self, number: int, is_open: bool, created: float):
+        if self.items.get(number) == (is_open, created):
+            return
+        self.discard(number)
+        self.items[number] = (is_open, created)
+        if is_open:
+            insort(self.opened, created)
+        else:
+            self.closed += 1
+
+    def counts(self, edge: datetime) -> Dict[str, int]:
+        """ Counters of the statistic, the items created not later than the edge are old
+        """
+        return {'closed': self.closed, 'opened': len(self.opened),
+                'old_opened': bisect_right(self.opened, edge.timestamp())}
+
+
+DAY = 24 * 3600
+
+
+def day_of(date: datetime) -> int:
+    return int(date.timestamp() // DAY)
+
+
+class DailyCounts:
+    """ Commits of each author by day (UTC) in the range they was counted for, the count
+    of an author for any range of days takes two bisects over the prefix sums
+
+    The counts of weekly statistic are kept by the first day of their week, so only
+    the ranges of whole weeks are covered by them.
+
+    :since datetime: start of the counted range, None from the first commit
+    :until datetime: end of the counted range, None till now (kept by incremental updates)
+    :bucket int: seconds of the counted periods, a day or a week
+    :offset int: seconds of the start of the first period since the epoch
+    """
+
+    def __init__(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 bucket: int = DAY, offset: int = 0):
+        self.since = since
+        self.until = until
+        self.bucket = bucket
+        self.offset = offset
+        self.days: Dict[str, Dict[int, int]] = {}
+        self.emails: Dict[str, str] = {}
+        # login -> sorted days and prefix sums of their counts, built on demand
+        self.index: Dict[str, Tuple[array, array]] = {}
+
+    @property
+    def by_day(self) -> bool:
+        return self.bucket == DAY
+
+    def add(self, login: str, email: str, date: datetime, count: int = 1):
+        days = self.days.get(login)
+        if days is None:
+            days = self.days[login] = {}
+            self.emails[login] = email
+        day = day_of(date)
+        days[day] = days.get(day, 0) + count
+        self.index.pop(login, None)
+
+    def covers(self, since: Optional[datetime], until: Optional[datetime]) -> bool:
+        """ The range is inside of the counted one and its bounds are whole periods
+        """
+        if any(date is not None and (date.timestamp() - self.offset) % self.bucket
+               for date in (since, until)):
+            return False
+        return ((self.since is None or (since is not None and since >= self.since))
+                and (self.until is None or (until is not None and until <= self.until)))
+
+    def count(self, login: str, first: Optional[int] = None, last: Optional[int] = None) -> int:
+        """ Commits of the author from the first to the last day inclusive
+        """
+        index = self.index.get(login)
+        if index is None:
+            items = sorted(self.days[login].items())
+            days = array('l', (day for day, _ in items))
+            sums = array('l', [0])
+            for _, count in items:
+                sums.append(sums[-1] + count)
+            index = self.index[login] = (days, sums)
+        days, sums = index
+        start = 0 if first is None else bisect_left(days, first)
+        end = len(days) if last is None else bisect_right(days, last)
+        return sums[end] - sums[start] if end > start else 0
+
+    def store(self, since: Optional[datetime], until: Optional[datetime],
+              size_top: int) -> 'ContributorStore':
+        """ Contributors of the range of whole days, the day of `until` is not included
+        """
+        first = None if since is None else day_of(since)
+        last = None if until is None else day_of(until) - 1
+        store = ContributorStore(size_top)
+        for login in self.days:
+            count = self.count(login, first, last)
+            if count:
+                store.add(login, email=self.emails[login], count=count)
+        return store
+
+    def dump(self) -> Dict:
+        return {'since': self.since and self.since.isoformat(),
+                'until': self.until and self.until.isoformat(),
+                'bucket': self.bucket, 'offset': self.offset,
+                'authors': [(login, self.emails[login], sorted(days.items()))
+                            for login, days in self.days.items()]}
+
+    @classmethod
+    def load(cls, data: Dict) -> 'DailyCounts':
+        daily = cls(data['since'] and datetime.fromisoformat(data['since']),
+                    data['until'] and datetime.fromisoformat(data['until']),
+                    data.get('bucket', DAY), data.get('offset', 0))
+        for login, email, days in data['authors']:
+            daily.days[login] = {day: count for day, count in days}
+            daily.emails[login] = email
+        return daily
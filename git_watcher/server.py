@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+from . import logger
+from .config import parse_date
+
+__all__ = ('Server',)
+
+
+class Server:
+    """ HTTP server of the watcher: receiver of GitHub webhooks, metrics of runtime
+    and read-only snapshots of the dashboard for many consumers
+
+    Events of webhooks are applied to the watcher at once and the polls only reconcile
+    events which was missed.
+
+    :webhook_secret str: secret of webhook, the signature `X-Hub-Signature-256` is checked by it,
+        all events are rejected without it
+    :webhooks bool: serve `POST /webhook`
+    :metrics bool: serve `GET /metrics` in the text format of Prometheus and `/metrics.json`
+    :serve bool: serve read-only `GET /snapshot` with the top contributors and statistic
+        in JSON and `GET /contributors?since=&until=` for any range of days inside
+        of the counted one
+    :window_token str: serve `PUT /window` with `{"since": .., "until": ..}` for change
+        the window of all consumers, only by `Authorization: Bearer <token>`
+    """
+
+    def __init__(self, watcher, host: str = '127.0.0.1', port: int = 0,
+                 webhook_secret: str = '', webhooks: bool = True, metrics: bool = False,
+                 serve: bool = False, window_token: str = ''):
+        self.watcher = watcher
+        self.host = host
+        self.port = port
+        self.secret = webhook_secret.encode()
+        self.window_token = window_token
+        self.app = web.Application()
+        if webhooks:
+            self.app.router.add_post('/webhook', self.webhook)
+        if metrics:
+            self.app.router.add_get('/metrics', self.metrics)
+            self.app.router.add_get('/metrics.json', self.metrics_json)
+        if serve:
+            self.app.router.add_get('/snapshot', self.snapshot)
+            self.app.router.add_get('/contributors', self.contributors)
+        if window_token:
+            self.app.router.add_put('/window', self.window)
+        self.runner: Optional[web.AppRunner] = None
+
+    def verify(self, body: bytes, signature: str) -> bool:
+        if not self.secret:
+            # without the secret no event can be trusted
+            return False
+        digest = hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(f'sha256={digest}', signature or '')
+
+    async def webhook(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.verify(body, request.headers.get('X-Hub-Signature-256', '')):
+            return web.json_response({'error': 'bad signature'}, status=401)
+
+        event = request.headers.get('X-GitHub-Event', '')
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.json_response({'error': 'bad payload'}, status=400)
+        if event == 'ping':
+            return web.json_response({'applied': False, 'event': event})
+
+        full_name = (payload.get('repository') or {}).get('full_name', '')
+        applied = self.watcher.apply_event(full_name, event, payload)
+        logger.debug('webhook %s of %s applied: %s', event, full_name, applied)
+        return web.json_response({'applied': applied, 'event': event})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.watcher.pool.metrics.prometheus(),
+                            content_type='text/plain', charset='utf-8')
+
+    async def metrics_json(self, request: web.Request) -> web.Response:
+        return web.json_response(self.watcher.pool.metrics.asdict())
+
+    async def snapshot(self, request: web.Request) -> web.Response:
+        etag, body = self.watcher.snapshot()
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, headers=headers, content_type='application/json')
+
+    @staticmethod
+    def window_of(data) -> Tuple[Optional[datetime], Optional[datetime]]:
+        return tuple(data.get(key) and parse_date(data[key]) for key in ('since', 'until'))
+
+    async def contributors(self, request: web.Request) -> web.Response:
+        try:
+            since, until = self.window_of(request.query)
+        except ValueError as ex:
+            return web.json_response({'error': str(ex)}, status=400)
+        top = self.watcher.top_contributors(since, until)
+        if top is None:
+            return web.json_response({'error': 'the range is not counted, its bounds must be '
+                                               'whole days (weeks by the statistic)'},
+                                     status=409)
+        return web.json_response([c.asdict() for c in top])
+
+    async def window(self, request: web.Request) -> web.Response:
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization, f'Bearer {self.window_token}'):
+            return web.json_response({'error': 'bad token'}, status=401)
+        try:
+            since, until = self.window_of(await request.json())
+        except ValueError as ex:
+            return web.json_response({'error': str(ex)}, status=400)
+        answered = self.watcher.set_window(since, until)
+        return web.json_response({'answered': answered})
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
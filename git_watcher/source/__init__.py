@@ -1,3 +1,30 @@
-# pylama:ignore=W0611  # noqa
-from .abstract import Request
-from .github import GitHub
+""" Providers of repository data, each is imported only by the first use, so the CLI
+and the package start without aiohttp and the modules of unused providers
+"""
+from importlib import import_module
+from typing import Dict, Tuple
+
+__all__ = ('PROVIDERS', 'provider_class', 'Request', 'Pool',
+           'GitHub', 'GitHubGraphQL', 'LocalGit')
+
+# registry of providers: name of `--provider` to the module and the class
+PROVIDERS: Dict[str, Tuple[str, str]] = {
+    'github': ('.github', 'GitHub'),
+    'graphql': ('.graphql', 'GitHubGraphQL'),
+    'local': ('.local', 'LocalGit'),
+}
+_LAZY = {'Request': '.abstract', 'Pool': '.abstract',
+         **{name: module for module, name in PROVIDERS.values()}}
+
+
+def provider_class(name: str):
+    module, cls = PROVIDERS[name]
+    return getattr(import_module(module, __name__), cls)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,39 +1,24 @@
 import asyncio
-import heapq
-import logging
 import re
 import time
 from abc import ABC, abstractmethod
-from base64 import b64encode
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional, AsyncGenerator, Generator, Mapping
+from typing import Dict, Any, Optional, AsyncGenerator, Generator, Mapping, Set
+from urllib.parse import urlparse
 
-from aiohttp import ClientSession, ClientResponseError, ClientResponse
+from aiohttp import (ClientSession, ClientResponseError, ClientResponse, ClientTimeout,
+                     TCPConnector, ClientConnectionError)
 
+from .cache import ResponseCache
+from .credentials import Credentials
+from .decode import Fields, decode_page, parse_iso
+from .retry import Backoff, CircuitBreaker, GiveUpError, is_retryable
+from .throttler import Throttler
 from .. import logger
-from ..objects import Contributor
-
-
-class Throttler:
-
-    def __init__(self, interval=6.0):
-        self.interval = interval
-        self.last_event_time = None
-        self.lock = asyncio.Lock()
-
-    async def __aenter__(self):
-        async with self.lock:
-            now = time.monotonic()
-            delay = 0
-            if self.last_event_time is not None:
-                delay = max(0, self.last_event_time + self.interval - now)
-                if delay:
-                    await asyncio.sleep(delay)
-            self.last_event_time = now + delay
-
-    async def __aexit__(self, *exc_info):
-        pass
+from ..metrics import Metrics, NULL_METRICS
+from ..objects import Contributor, ContributorStore, Destination, Watermark, Window
 
 
 class Request:
@@ -52,16 +37,98 @@ class Request:
 RequestsGenerator = Generator[Request, None, None]
 
 
+class Pool:
+    """ Keep-alive connections, the budget of API requests and the cache of responses,
+    one pool can be shared by providers of many repositories
+
+    :session ClientSession: opened by `start` and released by `close`
+    :metrics Metrics: registry of runtime metrics, no-op unless `--metrics` is given
+    :credentials Credentials: accounts of API, each paced by its own quota
+    :executor Executor: workers of `--parse-workers` for decoding of large pages
+    """
+    session: Optional[ClientSession] = None
+    keepalive_timeout: int = 30
+    # smaller pages are decoded faster than they are sent to a worker
+    offload_size: int = 32 * 1024
+
+    def __init__(self, config):
+        self.config = config
+        self.metrics = Metrics() if config.metrics else NULL_METRICS
+        self.credentials = Credentials.from_config(config, self.metrics)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.executor: Optional[Executor] = None
+        # pages sent to the workers and not decoded yet
+        self.decoding: Set[Future] = set()
+        self.cache = ResponseCache(config.cache_file, config.cache_size * 2 ** 20)
+
+    async def decode(self, body: bytes, fields: Fields = None):
+        """ Decode a page, large pages go to the workers so the loop keeps requesting
+        the next pages and drawing while they are parsed
+        """
+        if not self.config.parse_workers or len(body) < self.offload_size:
+            return decode_page(body, fields)
+        if self.executor is None:
+            executor_cls = (ProcessPoolExecutor if self.config.parse_executor == 'process'
+                            else ThreadPoolExecutor)
+            self.executor = executor_cls(max_workers=self.config.parse_workers)
+        future = self.executor.submit(decode_page, body, fields)
+        self.decoding.add(future)
+        future.add_done_callback(self.decoding.discard)
+        return await asyncio.wrap_future(future)
+
+    def breaker(self, path: str) -> CircuitBreaker:
+        breaker = self.breakers.get(path)
+        if breaker is None:
+            breaker = self.breakers[path] = CircuitBreaker()
+        return breaker
+
+    async def start(self):
+        if self.session is not None and not self.session.closed:
+            return
+        connector = TCPConnector(limit=self.config.pool_size,
+                                 limit_per_host=self.config.pool_size_per_host,
+                                 ttl_dns_cache=self.config.dns_cache_ttl,
+                                 keepalive_timeout=self.keepalive_timeout)
+        timeout = ClientTimeout(total=self.config.request_timeout)
+        self.session = ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        self.cache.save()
+        if self.executor is not None:
+            # the loop does not wait for the workers, the pages are not needed anymore
+            for future in list(self.decoding):
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
 class AbstractProvider(ABC):
     """ Base class for safely requests, paginate order requests and
     describe interface got load data
 
     :limit_exceeded bool: only for indicator about rate limit exceeded
+    :rate_remaining int: the rest of API quota of all credentials, None until the first response
+    :pool Pool: connections, budget of requests and cache of responses, the provider
+        opens and closes only its own pool (use the provider or the pool as async context)
+    :watermark Watermark: the newest counted commit for incremental updates of contributors
     """
     base_url: str
-    contributors: Dict[str, Contributor]
+    _contributors: ContributorStore
     pulls_info: Dict
-    throttler: Throttler
+    credentials: Credentials
+    pool: Pool
+    cache: ResponseCache
+    watermark: Optional[Watermark] = None
 
     since: Optional[datetime]
     until: Optional[datetime]
@@ -70,13 +137,15 @@ class AbstractProvider(ABC):
     paginate_patt: re.Pattern
     paginate_re = r''
     attempts_count: int = 10
-    attempts_max_interval: int = 60
-    limit_exceeded: bool = False
+    attempts_base_interval: float = 1.0
+    attempts_max_interval: float = 60
+    concurrency: int = 4
 
-    def __init__(self, config):
+    def __init__(self, config, dest: Optional[Destination] = None, pool: Optional[Pool] = None):
         self.config = config
-        self.owner = config.dest.owner
-        self.repo = config.dest.repo
+        dest = dest or config.dest
+        self.owner = dest.owner
+        self.repo = dest.repo
 
         self.since = config.since
         self.until = config.until
@@ -85,11 +154,99 @@ class AbstractProvider(ABC):
         self.issues_info = default_statistics('Issues')
         self.pulls_info = default_statistics('Pulls')
         self.paginate_patt = re.compile(self.paginate_re)
-        self.throttler = Throttler()
+        self.own_pool = pool is None
+        self.pool = pool or Pool(config)
+        self.credentials = self.pool.credentials
+        self.cache = self.pool.cache
+        self.metrics = self.pool.metrics
+        self.concurrency = max(1, config.concurrency)
+        self.backoff = Backoff(self.attempts_base_interval, self.attempts_max_interval)
+
+    @property
+    def contributors(self) -> ContributorStore:
+        return self._contributors
+
+    @contributors.setter
+    def contributors(self, value: Mapping[str, Contributor]):
+        if not isinstance(value, ContributorStore):
+            value = ContributorStore(self.config.size_top_table, value)
+        self._contributors = value
+
+    def new_contributors(self) -> ContributorStore:
+        return ContributorStore(self.config.size_top_table)
+
+    @property
+    def window(self) -> Window:
+        return self.branch, self.since, self.until
+
+    def state_key(self) -> str:
+        since, until = (d and d.isoformat() for d in self.window[1:])
+        return f'{type(self).__name__}:{self.owner}/{self.repo}:{self.branch}:{since}:{until}'
+
+    def dump_state(self) -> Dict[str, Any]:
+        """ Aggregated data of the provider for restore after restart
+        """
+        watermark = self.watermark and {
+            'sha': self.watermark.sha,
+            'date': self.watermark.date.isoformat(),
+            'seen': sorted(self.watermark.seen),
+            'pushed': sorted(self.watermark.pushed),
+        }
+        return {
+            'contributors': [(c.login, c.email, c.count) for c in self.contributors.values()],
+            'pulls_info': self.pulls_info,
+            'issues_info': self.issues_info,
+            'watermark': watermark,
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        self.contributors = {login: Contributor(login, count, email)
+                             for login, email, count in state['contributors']}
+        self.pulls_info.update(state['pulls_info'])
+        self.issues_info.update(state['issues_info'])
+        watermark = state.get('watermark')
+        self.watermark = watermark and Watermark(watermark['sha'], parse_iso(watermark['date']),
+                                                 set(watermark['seen']), window=self.window,
+                                                 pushed=set(watermark.get('pushed', ())))
+
+    @property
+    def session(self) -> Optional[ClientSession]:
+        return self.pool.session
+
+    async def start(self):
+        await self.pool.start()
+
+    async def close(self):
+        if self.own_pool:
+            await self.pool.close()
+        else:
+            self.cache.save()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def set_window(self, since: Optional[datetime], until: Optional[datetime]) -> bool:
+        """ Change the window of counted data at runtime, the next update counts it again
+
+        :return: True if the contributors are already counted for the new window
+        """
+        self.since, self.until = since, until
+        return False
+
+    def apply_event(self, event: str, payload: Dict[str, Any]) -> bool:
+        """ Apply a webhook event to the counted data
+
+        :return: True if the data changed
+        """
+        return False
 
     @abstractmethod
     def parse_contributors(self, res: Dict[str, Any],
-                           storage: Optional[Mapping]) -> Generator:
+                           storage: ContributorStore) -> Generator:
         """ Return contributors instance from raw response of commits
         """
 
@@ -123,50 +280,112 @@ class AbstractProvider(ABC):
         Generate and call each possible request for results
         """
 
+    def endpoint(self, url: str) -> str:
+        """ Label of metrics: the first part of path after the repository
+        """
+        path = urlparse(url).path
+        prefix = f'/repos/{self.owner}/{self.repo}'
+        if not path.startswith(prefix):
+            return path
+        parts = path[len(prefix):].split('/')
+        return '/' + (parts[1] if len(parts) > 1 else '')
+
     @asynccontextmanager
     async def single_request(self, req: Request) -> AsyncGenerator[ClientResponse, None]:
         """ Main safely request for one result
         """
 
         headers = req.kwargs.pop('headers', {})
-        if self.config.auth:
-            auth_data = b64encode(self.config.auth.encode()).decode()
-            headers['Authorization'] = f'Basic {auth_data}'
 
-        for _ in range(self.attempts_count):
+        if self.session is None:
+            await self.start()
+        session = self.session
+        assert session is not None
+
+        metrics = self.metrics
+        endpoint = metrics.enabled and self.endpoint(req.url)
+        path = urlparse(req.url).path
+        breaker = self.pool.breaker(path)
+        yielded = False
+        for attempt in range(self.attempts_count):
+            breaker.check(path)
+            if attempt:
+                metrics.inc('retries_total', endpoint=endpoint)
+            # the credential is chosen again on retry, the exhausted one waits for reset
+            credential = self.credentials.choose()
+            throttler = credential.throttler
             try:
-                async with self.throttler, self.session() as s, \
-                        s.request(req.method, req.url, *req.args, **req.kwargs,
-                                  headers=headers, raise_for_status=True) as resp:
-                    yield resp
-            except ClientResponseError as ex:
-                req_headers: Mapping = ex.headers or {}
-                remain = req_headers.get('X-RateLimit-Remaining')
-                if remain == '0':
-                    self.limit_exceeded = True
-                    rate_reset = int(req_headers.get('X-RateLimit-Reset', 0))
-                    now_t_stamp = datetime.utcnow().timestamp()
-                    wait_reset = int(rate_reset - now_t_stamp)
-
-                    logger.warning(f'API rate limit exceeded, wait {wait_reset}s')
-                    await asyncio.sleep(wait_reset)
+                async with credential:
+                    started = time.perf_counter()
+                    async with session.request(req.method, req.url, *req.args, **req.kwargs,
+                                               headers={**headers, **credential.headers},
+                                               raise_for_status=True) as resp:
+                        metrics.observe('request_seconds', time.perf_counter() - started,
+                                        endpoint=endpoint)
+                        metrics.inc('responses_total', endpoint=endpoint, status=resp.status)
+                        throttler.update(resp.headers)
+                        breaker.success()
+                        yielded = True
+                        yield resp
+            except (ClientResponseError, ClientConnectionError, asyncio.TimeoutError) as ex:
+                if yielded:
+                    raise
+                action = self.on_error(ex, throttler, endpoint)
+                if action == 'raise':
+                    raise
+                if action == 'wait':
+                    # the quota is over, it is not a failure of the endpoint
                     continue
-
-                logging.warning(f'Error: {ex}')
-                await asyncio.sleep(self.attempts_max_interval)
+                error = ex
             else:
-                self.limit_exceeded = False
                 return
-        raise RuntimeError(f'give up after {self.attempts_count} attempts on {req.url}')
 
-    def get_top_contributors(self):
-        return heapq.nlargest(self.config.size_top_table,
-                              self.contributors.values(),
-                              key=lambda a: a.count)
+            delay = self.backoff.delay(attempt)
+            logger.warning(f'Error: {error!r} on {path}, retry in {delay:.1f}s')
+            metrics.inc('retry_sleep_seconds_total', delay, endpoint=endpoint)
+            await asyncio.sleep(delay)
+        # the breaker counts failed requests, the retries of one request do not open it
+        breaker.failure()
+        raise GiveUpError(f'give up after {self.attempts_count} attempts on {req.url}')
+
+    def on_error(self, ex: Exception, throttler: Throttler, endpoint) -> str:
+        """ Classify an error of request: `wait` for the quota or the requested delay,
+        `retry` with backoff or `raise`
+        """
+        if not isinstance(ex, ClientResponseError):
+            self.metrics.inc('responses_total', endpoint=endpoint, status=type(ex).__name__)
+            return 'retry'
+        self.metrics.inc('responses_total', endpoint=endpoint, status=ex.status)
+        throttler.update(ex.headers or {})
+        if throttler.limit_exceeded:
+            wait_reset = int((throttler.reset or 0) - time.time())
+            logger.warning(f'API rate limit exceeded, wait {wait_reset}s')
+            return 'wait'
+        if throttler.blocked_until > time.monotonic():
+            logger.warning(f'Error: {ex}, retry after the requested delay')
+            return 'wait'
+        return 'retry' if is_retryable(ex.status) else 'raise'
+
+    @property
+    def limit_exceeded(self) -> bool:
+        return self.credentials.limit_exceeded
+
+    @property
+    def rate_remaining(self) -> Optional[int]:
+        return self.credentials.remaining
+
+    def valid_dates(self, item, key_date='date') -> Optional[datetime]:
+        """Check date period from config and return date from key if valid or None"""
+
+        date = parse_iso(item[key_date])
+        if self.since and date < self.since:
+            return None
+        if self.until and date > self.until:
+            return None
+        return date
 
-    @staticmethod
-    def session(*args, **kwargs):
-        return ClientSession(*args, **kwargs)
+    def get_top_contributors(self):
+        return self.contributors.top_contributors(self.config.size_top_table)
 
 
 def default_statistics(name):
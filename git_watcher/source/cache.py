@@ -0,0 +1,81 @@
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Optional, Mapping
+
+from .. import logger
+
+__all__ = ('CacheEntry', 'ResponseCache')
+
+
+@dataclass
+class CacheEntry:
+    etag: str = ''
+    last_modified: str = ''
+    links: str = ''
+    data: Any = None
+    size: int = 0
+
+
+class ResponseCache:
+    """ LRU storage of decoded pages with their validators for conditional requests
+
+    :path str: file for keep the pages between restarts, empty for memory only
+    :max_size int: limit in bytes of raw bodies, the least recently used pages evicted first
+    """
+    entries: 'OrderedDict[str, CacheEntry]'
+
+    def __init__(self, path: str = '', max_size: int = 64 * 2 ** 20):
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.load()
+
+    @staticmethod
+    def key(url: str, params: Optional[Mapping] = None) -> str:
+        params = params or {}
+        query = '&'.join(f'{k}={params[k]}' for k in sorted(params) if params[k] is not None)
+        return f'{url}?{query}'
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry):
+        self.pop(key)
+        if entry.size > self.max_size:
+            return
+        self.entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def pop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def load(self):
+        if not self.path or not Path(self.path).exists():
+            return
+        try:
+            raw = json.loads(Path(self.path).read_text())
+        except (OSError, ValueError) as ex:
+            logger.warning(f'Skip broken cache {self.path}: {ex}')
+            return
+        for key, item in raw.items():
+            self.put(key, CacheEntry(**item))
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({k: asdict(v) for k, v in self.entries.items()}, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,100 @@
+import os
+import time
+from base64 import b64encode
+from pathlib import Path
+from typing import List, Sequence
+
+from .throttler import Throttler
+from ..metrics import Metrics, NULL_METRICS
+
+__all__ = ('Credential', 'Credentials')
+
+
+class Credential:
+    """ One account of API with its own quota, paced by its own throttler
+
+    :auth str: `login:password` for the basic authorization, a token without colon or
+        empty for anonymous requests
+    :inflight int: count of requests which are sent but not finished yet
+    """
+    __slots__ = ('auth', 'headers', 'throttler', 'inflight')
+
+    def __init__(self, auth: str = '', metrics: Metrics = NULL_METRICS):
+        self.auth = auth
+        if not auth:
+            self.headers = {}
+        elif ':' in auth:
+            self.headers = {'Authorization': f'Basic {b64encode(auth.encode()).decode()}'}
+        else:
+            self.headers = {'Authorization': f'token {auth}'}
+        self.throttler = Throttler(metrics=metrics)
+        self.inflight = 0
+
+    def ready_in(self) -> float:
+        """ Seconds until the quota is reset or the requested delay is over
+        """
+        throttler = self.throttler
+        wait = throttler.blocked_until - time.monotonic()
+        if throttler.limit_exceeded:
+            wait = max(wait, (throttler.reset or 0) - time.time())
+        return max(wait, 0.0)
+
+    def headroom(self):
+        """ Key of choice: available credentials by the rest of quota, then the exhausted
+        by the nearest reset
+        """
+        wait = self.ready_in()
+        if wait > 0:
+            return 0, -wait
+        remaining = self.throttler.remaining
+        # an unknown quota is not spent yet
+        return 1, (float('inf') if remaining is None else remaining) - self.inflight
+
+    async def __aenter__(self):
+        self.inflight += 1
+        try:
+            await self.throttler.__aenter__()
+        except BaseException:
+            self.inflight -= 1
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.inflight -= 1
+
+
+class Credentials:
+    """ Pool of credentials, each request goes by the credential with the most headroom,
+    so the budget of all accounts is used together
+
+    Credentials are taken from `--auth`, the lines of `--auth-file` and the comma
+    separated `GIT_WATCHER_AUTH`, without them requests are anonymous.
+    """
+    env = 'GIT_WATCHER_AUTH'
+
+    def __init__(self, auths: Sequence[str] = (), metrics: Metrics = NULL_METRICS):
+        self.items: List[Credential] = [Credential(auth, metrics) for auth in dict.fromkeys(auths)]
+        if not self.items:
+            self.items.append(Credential('', metrics))
+
+    @classmethod
+    def from_config(cls, config, metrics: Metrics = NULL_METRICS) -> 'Credentials':
+        auths = [config.auth] if config.auth else []
+        if config.auth_file:
+            lines = Path(config.auth_file).read_text().splitlines()
+            auths += [line.strip() for line in lines
+                      if line.strip() and not line.startswith('#')]
+        auths += [auth.strip() for auth in os.environ.get(cls.env, '').split(',') if auth.strip()]
+        return cls(auths, metrics)
+
+    def choose(self) -> Credential:
+        return max(self.items, key=Credential.headroom)
+
+    @property
+    def limit_exceeded(self) -> bool:
+        return all(c.throttler.limit_exceeded for c in self.items)
+
+    @property
+    def remaining(self):
+        known = [c.throttler.remaining for c in self.items if c.throttler.remaining is not None]
+        return sum(known) if known else None
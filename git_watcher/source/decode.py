@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+__all__ = ('Fields', 'project', 'decode_page', 'parse_iso')
+
+# nested names of kept fields, None keeps the value as is
+Fields = Optional[Dict[str, Any]]
+
+
+def project(data, fields: Fields):
+    """ Keep only the fields of an item or of each item from a list
+    """
+    if fields is None or data is None:
+        return data
+    if isinstance(data, list):
+        return [project(item, fields) for item in data]
+    if isinstance(data, dict):
+        return {k: project(data[k], sub) for k, sub in fields.items() if k in data}
+    return data
+
+
+def decode_page(body: bytes, fields: Fields = None):
+    """ Decode the body of response and drop the fields are not used by parsers,
+    so nested objects of a page are released right after decoding
+    """
+    return project(json.loads(body), fields)
+
+
+@lru_cache(maxsize=2 ** 16)
+def parse_iso(value: str) -> datetime:
+    """ Parse ISO 8601 date of API, it is much cheaper than `strptime`
+    """
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
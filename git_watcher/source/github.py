@@ -1,10 +1,20 @@
-from collections import Counter
-from datetime import datetime, timezone as tz
-from typing import Callable, Optional
+import asyncio
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone as tz
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urljoin
 
+from aiohttp import ClientResponseError
+
 from .abstract import AbstractProvider, Request
-from ..objects import Contributor
+from .cache import CacheEntry
+from .decode import Fields, parse_iso
+from .. import logger
+from ..objects import ContributorStore, DailyCounts, ItemStates, Watermark, Window
+
+WEEK = 7 * 24 * 3600
+# the first Sunday since the epoch, 1970-01-04
+WEEK_START = 3 * 24 * 3600
 
 
 class GitHub(AbstractProvider):
@@ -12,129 +22,510 @@ class GitHub(AbstractProvider):
     issue_edge_days = 14
     base_url = 'https://api.github.com/'
     paginate_re = r'&page=(?P<n>\d+)>;\srel="(?P<name>\w+)"'
+    default_branch: Optional[str] = None
+    stats_attempts = 5
+    stats_poll_interval = 2.0
+    pull_states: ItemStates
+    issue_states: ItemStates
+    daily: Optional[DailyCounts]
+    # commits listed by the running or the last poll of contributors
+    polled: Set[str]
+    # commits counted by push events since the last statistic of contributors
+    weekly_pushed: Set[str]
+
+    # only these fields of responses are kept for parsers
+    commit_fields: Fields = {
+        'sha': None,
+        'commit': {'author': {'email': None, 'date': None}, 'committer': {'date': None}},
+        'author': {'login': None},
+    }
+    item_fields: Fields = {'number': None, 'state': None, 'created_at': None,
+                           'updated_at': None, 'draft': None, 'pull_request': {'url': None}}
+    compare_fields: Fields = {'status': None, 'commits': commit_fields}
+    stats_fields: Fields = {'author': {'login': None}, 'weeks': {'w': None, 'c': None}}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pull_states = ItemStates()
+        self.issue_states = ItemStates()
+        self.daily = None
+        self.polled = set()
+        self.weekly_pushed = set()
+
+    def dump_state(self) -> Dict[str, Any]:
+        state = super().dump_state()
+        for key, states in (('pull_states', self.pull_states), ('issue_states', self.issue_states)):
+            state[key] = {'cursor': states.cursor and states.cursor.isoformat(),
+                          'items': [(n, *item) for n, item in states.items.items()]}
+        state['daily'] = self.daily and self.daily.dump()
+        return state
+
+    def load_state(self, state: Dict[str, Any]):
+        super().load_state(state)
+        for key in ('pull_states', 'issue_states'):
+            data = state.get(key)
+            if not data or not data['cursor']:
+                continue
+            states = ItemStates(self.window)
+            for number, is_open, created in data['items']:
+                states.set(number, is_open, created)
+            states.cursor = parse_iso(data['cursor'])
+            setattr(self, key, states)
+        if state.get('daily'):
+            self.daily = DailyCounts.load(state['daily'])
+            if self.watermark:
+                self.watermark.window = self.counted_window()
 
     async def update_contributors(self):
+        """ Count commits page by page, with `--contributors-source stats` take
+        the precomputed statistic when the window is lined up by weeks
+        """
+        daily = self.daily
+        counted = daily is not None and daily.by_day and daily.covers(self.since, self.until)
+        if (self.config.contributors_source == 'stats' and not counted
+                and self.weekly_window() and await self.is_default_branch()):
+            if await self.update_contributors_by_stats():
+                return
+        await self.update_contributors_by_commits()
+
+    def weekly_window(self) -> bool:
+        """ The statistic of GitHub is bucketed by weeks from Sunday 00:00 UTC
+        """
+        return all(date is None or (date.timestamp() - WEEK_START) % WEEK == 0
+                   for date in (self.since, self.until))
+
+    async def is_default_branch(self) -> bool:
+        """ The statistic of GitHub is counted only for the default branch
+        """
+        if self.default_branch is None:
+            url = urljoin(self.base_url, f'/repos/{self.owner}/{self.repo}')
+            repo = await self.fetch(Request('GET', url), fields={'default_branch': None})
+            self.default_branch = repo.get('default_branch', '')
+        return self.branch == self.default_branch
+
+    async def update_contributors_by_stats(self) -> bool:
+        """ Count commits of contributors by weekly buckets of `/stats/contributors`,
+        commits of authors without GitHub account are not there. The buckets are kept
+        as weekly counts, so a window of whole weeks is answered without requests.
+
+        :return: False if GitHub did not finish computing the statistic in time
+        """
+        url = urljoin(self.base_url, f'/repos/{self.owner}/{self.repo}/stats/contributors')
+        for _ in range(self.stats_attempts):
+            stats = await self.fetch(Request('GET', url), fields=self.stats_fields)
+            # GitHub answers 202 with an empty object while the statistic is computing
+            if isinstance(stats, list):
+                break
+            await asyncio.sleep(self.stats_poll_interval)
+        else:
+            logger.warning('Statistic of contributors is not ready, count commits')
+            return False
+
+        weekly = DailyCounts(bucket=WEEK, offset=WEEK_START)
+        for item in stats:
+            if not item.get('author'):
+                continue
+            for week in item['weeks']:
+                if week['c']:
+                    weekly.add(item['author']['login'], '',
+                               datetime.fromtimestamp(week['w'], tz=tz.utc), week['c'])
+
+        self.watermark = None
+        self.daily = weekly
+        self.polled = set()
+        self.weekly_pushed = set()
+        self.contributors = weekly.store(self.since, self.until, self.config.size_top_table)
+        return True
+
+    async def update_contributors_by_commits(self):
+        """ Count only commits after the head of the last update, all the history
+        is counted again on the first update, on change of the window or after rewrite
+        of the branch (force-push)
+
+        The new commits are listed by compare with the last head, so commits of merged
+        branches are counted even when their dates are older than the last update.
+        The commits are kept by day too, a window inside of the counted one
+        is answered from the daily counts without requests (see `set_window`).
+        """
+        window = self.counted_window()
+        watermark, pages = await self.commit_pages(window)
+        daily = self.daily if watermark else DailyCounts(window[1], window[2])
+        # the window is the counted one unless it was changed inside of it
+        by_daily = window != self.window
+        _contributors = self.contributors if watermark else self.new_contributors()
+        newest = watermark and replace(watermark, seen=set(watermark.seen))
+        storage = None if by_daily else _contributors
+        counted_pushed: Set[str] = set()
+        self.polled = set()
+        # the new commits are counted after the last page, so the commits of pages read
+        # before a failure are not counted twice by the retry from the same head
+        pending: List[Dict] = []
+        head = None
+        async for resp in pages:
+            if resp:
+                # compare goes from the oldest commit, a listing starts from the head
+                head = resp[-1]['sha'] if watermark else head or resp[0]['sha']
+            commits = [c for c in resp if self.in_window(c, window)]
+            newest = self.advance_watermark(newest, commits, window)
+            commits = self.not_pushed(commits, watermark, counted_pushed)
+            if watermark:
+                pending.extend(commits)
+            else:
+                self.count_commits(commits, daily, storage)
+        self.count_commits(pending, daily, storage)
+
+        if newest and head:
+            newest.sha = head
+        if newest and watermark:
+            newest.pushed = watermark.pushed - counted_pushed
+        self.watermark = newest
+        self.daily = daily
+
+        if by_daily:
+            _contributors = daily.store(self.since, self.until, self.config.size_top_table)
+        self.contributors = _contributors
+
+    async def commit_pages(self, window) -> Tuple[Optional[Watermark], AsyncIterator[List]]:
+        """ Pages of the new commits after the watermark, or of all commits in the window
+        without the watermark
+        """
+        watermark = self.watermark
+        if watermark and watermark.window == window:
+            pages = await self.compare_commits(watermark.sha)
+            if pages is not None:
+                return watermark, pages
+
+        _, since, until = window
         url = urljoin(self.base_url, f'/repos/{self.owner}/{self.repo}/commits')
         params = {
-            'since': self.since and self.since.isoformat(),
-            'until': self.until and self.until.isoformat(),
+            'since': since and since.isoformat(),
+            'until': until and until.isoformat(),
             'sha': self.branch,
             'per_page': 100,
         }
         params = {k: v for k, v in params.items() if v}
+        return None, self.request('GET', url, params=params, fields=self.commit_fields)
+
+    def in_window(self, commit, window) -> bool:
+        # compare is not filtered by the window
+        _, since, until = window
+        date = self.commit_date(commit)
+        return not ((since and date < since) or (until and date > until))
+
+    def advance_watermark(self, newest: Optional[Watermark], commits,
+                          window) -> Optional[Watermark]:
+        for commit in commits:
+            sha, date = commit['sha'], self.commit_date(commit)
+            if newest is None:
+                newest = Watermark(sha, date, window=window)
+            newest.advance(sha, date)
+        return newest
+
+    def not_pushed(self, commits, watermark: Optional[Watermark], counted_pushed: Set[str]):
+        """ Skip commits already counted by push events, the rest is recorded as polled
+        while webhooks are received, so a late push event does not count them again
+        """
+        if self.config.webhooks:
+            self.polled.update(c['sha'] for c in commits)
+        if watermark is None or not watermark.pushed:
+            return commits
+        counted_pushed.update(c['sha'] for c in commits if c['sha'] in watermark.pushed)
+        return [c for c in commits if c['sha'] not in watermark.pushed]
+
+    def count_commits(self, commits, daily: Optional[DailyCounts],
+                      storage: Optional[ContributorStore]):
+        if daily is not None:
+            for commit in commits:
+                daily.add(*self.commit_author(commit),
+                          parse_iso(commit['commit']['author']['date']))
+        if storage is not None:
+            list(self.parse_contributors(commits, storage))
+
+    def counted_window(self) -> Window:
+        """ Window of counted commits: the range of the daily counts while it covers
+        the window of the provider, otherwise the window
+        """
+        daily = self.daily
+        if daily is not None and daily.by_day and daily.covers(self.since, self.until):
+            return self.branch, daily.since, daily.until
+        return self.window
 
-        _contributors = {}
-        async for resp in self.request('GET', url, params=params):
-            list(self.parse_contributors(resp, _contributors))
+    def set_window(self, since: Optional[datetime], until: Optional[datetime]) -> bool:
+        super().set_window(since, until)
+        daily = self.daily
+        if daily is None or not daily.covers(since, until):
+            return False
+        if daily.by_day and self.watermark is None:
+            return False
+        self.contributors = daily.store(since, until, self.config.size_top_table)
+        return True
 
-        self.contributors.clear()
-        self.contributors.update(_contributors)
+    async def compare_commits(self, sha: str) -> Optional[AsyncIterator[List[Dict]]]:
+        """ Pages of commits of the branch after the last counted head, from the oldest
+
+        :return: None if the head is not an ancestor of the branch anymore
+        """
+        url = urljoin(self.base_url, f'/repos/{self.owner}/{self.repo}/compare/'
+                                     f'{sha}...{self.branch}')
+        requests = self.generate_requests('GET', url, params={'per_page': 100})
+        first = next(requests)
+        try:
+            resp = await self.fetch(first, fields=self.compare_fields)
+        except ClientResponseError as ex:
+            if ex.status not in (404, 422):
+                raise
+            # the last head is unknown to the branch, e.g. gone after a force-push
+            logger.warning(f'Can not compare with the last head: {ex}')
+            return None
+        if resp.get('status') not in ('ahead', 'identical'):
+            logger.warning(f'History of {self.branch} was rewritten, count all commits')
+            return None
+
+        async def pages():
+            yield resp.get('commits') or []
+            for request in requests:
+                page = await self.fetch(request, fields=self.compare_fields)
+                yield page.get('commits') or []
+        return pages()
+
+    @staticmethod
+    def commit_date(commit) -> datetime:
+        return parse_iso(commit['commit']['committer']['date'])
+
+    def item_states(self, states: ItemStates) -> ItemStates:
+        """ Keep the states while the window is the same, otherwise count all items again
+        """
+        if states.cursor is None or states.window != self.window:
+            return ItemStates(self.window)
+        return states
+
+    def apply_items(self, states: ItemStates, items,
+                    k_filter: Optional[Callable] = None):
+        for item in items:
+            created_at = self.valid_dates(item, key_date='created_at')
+            if not created_at or (k_filter is not None and k_filter(item)):
+                states.discard(item['number'])
+            else:
+                states.set(item['number'], item['state'] == 'open', created_at.timestamp())
+
+    @staticmethod
+    def edge(edge_days: int) -> datetime:
+        """ The open items created not later than the edge are old
+        """
+        return datetime.now(tz=tz.utc) - timedelta(days=edge_days + 1)
 
     async def update_pulls_info(self):
+        """ Count all pull requests on the first update, then only the updated since the last
+        """
         url = urljoin(self.base_url, f'/repos/{self.owner}/{self.repo}/pulls')
+        states = self.item_states(self.pull_states)
+        cursor = states.cursor
         params = {'base': self.branch, 'state': 'all', 'per_page': 100}
-        info = Counter()
+        if cursor:
+            # the pulls can not be filtered by update, so they go from the last updated
+            # one by one page until the cursor
+            params.update(sort='updated', direction='desc')
+
+        newest = cursor
+        async for resp in self.request('GET', url, params=params, fields=self.item_fields,
+                                       fan_out=cursor is None):
+            self.apply_items(states, resp, k_filter=lambda pr: pr['draft'])
+            updated = [parse_iso(pr['updated_at']) for pr in resp]
+            newest = max(filter(None, (newest, *updated)), default=None)
+            if cursor and updated and updated[-1] < cursor:
+                break
 
-        async for resp in self.request('GET', url, params=params):
-            counter = self.count_state_results(resp,
-                                               edge_days=self.pr_edge_days,
-                                               k_filter=lambda pr: pr['draft'])
-            info.update(counter)
+        states.cursor = newest
+        self.pull_states = states
         self.pulls_info.clear()
-        self.pulls_info.update({'name': 'Pulls', **info})
+        self.pulls_info.update({'name': 'Pulls', **states.counts(self.edge(self.pr_edge_days))})
 
     async def update_issues_info(self):
+        """ Count all issues on the first update, then only the updated since the last
+        """
         url = urljoin(self.base_url, f'/repos/{self.owner}/{self.repo}/issues')
-        params = {'since': self.since and self.since.isoformat(),
-                  'state': 'all', 'per_page': 100}
+        states = self.item_states(self.issue_states)
+        since = max(filter(None, (self.since, states.cursor)), default=None)
+        params = {'since': since and since.isoformat(), 'state': 'all', 'per_page': 100}
         params = {k: v for k, v in params.items() if v}
 
-        info = Counter()
+        def _filter(iss):
+            # GitHub's REST API v3 considers every pull request an issue
+            return 'pull_request' in iss
 
-        async for resp in self.request('GET', url, params=params):
-            def _filter(iss):
-                # GitHub's REST API v3 considers every pull request an issue
-                return 'pull_request' in iss
+        newest = states.cursor
+        async for resp in self.request('GET', url, params=params, fields=self.item_fields):
+            self.apply_items(states, resp, k_filter=_filter)
+            updated = [parse_iso(issue['updated_at']) for issue in resp]
+            newest = max(filter(None, (newest, *updated)), default=None)
 
-            counter = self.count_state_results(resp, edge_days=self.issue_edge_days,
-                                               k_filter=_filter)
-            info.update(counter)
+        states.cursor = newest
+        self.issue_states = states
         self.issues_info.clear()
-        self.issues_info.update({'name': 'Issues', **info})
+        self.issues_info.update({'name': 'Issues',
+                                 **states.counts(self.edge(self.issue_edge_days))})
 
-    def count_state_results(self, data, edge_days=None, k_filter: Callable = None) -> Counter:
-        """ Count sate open, closed and the open old items from Issues or Pull Request
-        :return: Counter(closed=<a>, opened=<b>, old_opened=<c>)
+    def apply_event(self, event, payload):
+        """ Apply `push`, `issues` and `pull_request` events, the data which can not be
+        updated exactly by an event (e.g. a force-push) is left for the next poll
         """
+        if event == 'push':
+            return self.apply_push(payload)
+        if event == 'issues':
+            return self.apply_state_change(self.issues_info, self.issue_states, payload['action'],
+                                           payload['issue'], self.issue_edge_days)
+        if event == 'pull_request':
+            pr = payload['pull_request']
+            if pr['base']['ref'] != self.branch:
+                return False
+            return self.apply_state_change(self.pulls_info, self.pull_states, payload['action'],
+                                           pr, self.pr_edge_days)
+        return False
 
-        counter: Counter = Counter(closed=0, opened=0, old_opened=0)
-        now = datetime.now(tz=tz.utc)
-        for item in data:
+    def apply_push(self, payload) -> bool:
+        """ Count the commits of a push, the commits listed by a poll of contributors
+        (also by the running one) are skipped. The weekly statistic has no watermark,
+        its pushes are counted till the next statistic replaces them.
+        """
+        watermark = self.watermark
+        weekly = watermark is None and self.daily is not None and not self.daily.by_day
+        if payload['ref'] != f'refs/heads/{self.branch}' or not (watermark or weekly):
+            return False
+        if payload.get('forced'):
+            # the history is rewritten, the next poll counts all commits again
+            self.watermark = None
+            return False
+        if watermark and (payload['after'] == watermark.sha or payload['after'] in self.polled):
+            # the poll has already counted this push
+            return False
 
-            if k_filter and k_filter(item):
+        pushed = watermark.pushed if watermark else self.weekly_pushed
+        for commit in payload['commits']:
+            sha = commit['id']
+            author = commit['author']
+            if not commit.get('distinct', True) or sha in pushed or sha in self.polled:
                 continue
-
-            created_at = self.valid_dates(item, key_date='created_at')
-            if not created_at:
+            if weekly and not author.get('username'):
+                # the statistic has no authors without GitHub account
                 continue
+            pushed.add(sha)
+            if self.daily is not None:
+                self.daily.add(author.get('username') or author['email'], author['email'],
+                               parse_iso(commit['timestamp']))
+            if self.valid_dates(commit, key_date='timestamp'):
+                self.contributors.add(author.get('username') or author['email'],
+                                      email=author['email'])
+        return True
 
-            if item['state'] == 'open':
-                counter.update(opened=1)
+    def apply_state_change(self, info, states: ItemStates, action, item, edge_days) -> bool:
+        if states is not self.item_states(states):
+            # the items are not counted yet, the next poll counts them
+            return False
+        if action in ('deleted', 'transferred'):
+            states.discard(item['number'])
+        else:
+            self.apply_items(states, [item], k_filter=lambda i: i.get('draft'))
+        info.update(states.counts(self.edge(edge_days)))
+        return True
 
-                if (now - created_at).days > edge_days:
-                    counter.update(old_opened=1)
-            elif item['state'] == 'closed':
-                counter.update(closed=1)
-        return counter
+    @staticmethod
+    def commit_author(commit) -> Tuple[str, str]:
+        git_author = commit['commit']['author']
+        hub_author = commit.get('author')
+        if not hub_author:
+            # this a commit from local repository without github account
+            return git_author.get('email'), git_author['email']
+        return hub_author.get('login'), git_author['email']
 
     def parse_contributors(self, data, storage):
         for commit in data:
-            git_author = commit['commit']['author']
-            hub_author = commit.get('author')
-            if not hub_author:
-                # this a commit from local repository without github account
-                login = git_author.get('email')
-            else:
-                login = hub_author.get('login')
-
-            if not self.valid_dates(git_author, key_date='date'):
+            if not self.valid_dates(commit['commit']['author'], key_date='date'):
                 continue
 
-            if login not in storage:
-                storage[login] = Contributor(login=login,
-                                             email=git_author['email'],
-                                             count=1)
-                yield storage[login]
-            else:
-                storage[login].count += 1
+            login, email = self.commit_author(commit)
+            contributor = storage.add(login, email=email)
+            if contributor:
+                yield contributor
 
     def generate_requests(self, *a, **kw):
         request = Request(*a, **kw)
         yield request
 
         while 'next' in request.paginate:
-            next = request.paginate['next']
-            kwargs = request.kwargs.copy()
-            params = kwargs.pop('params', {})
-            params['page'] = next
-            request = Request(request.method, request.url, *request.args,
-                              params=params, **kwargs)
+            request = self.page_request(request, request.paginate['next'])
             yield request
 
-    async def request(self, *args, **kwargs):
-        for request in self.generate_requests(*args, **kwargs):
-            async with self.single_request(request) as resp:
+    @staticmethod
+    def page_request(request, page):
+        kwargs = request.kwargs.copy()
+        params = dict(kwargs.pop('params', {}))
+        params['page'] = page
+        return Request(request.method, request.url, *request.args,
+                       params=params, **kwargs)
+
+    async def fetch(self, request, fields: Fields = None):
+        """ Request one page, unchanged pages are served from the cache by validators
+        """
+        key = self.cache.key(request.url, request.kwargs.get('params'))
+        cached = self.cache.get(key)
+        if cached is not None:
+            headers = dict(request.kwargs.get('headers', {}))
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+            request.kwargs['headers'] = headers
+
+        endpoint = self.metrics.enabled and self.endpoint(request.url)
+        async with self.single_request(request) as resp:
+            self.metrics.inc('pages_total', endpoint=endpoint)
+            if cached is not None and resp.status == 304:
+                self.metrics.inc('not_modified_total', endpoint=endpoint)
+                links, data = cached.links, cached.data
+            else:
                 links = resp.headers.get('Link', '')
-                pages = {name: page for page, name in self.paginate_patt.findall(links)}
-                request.paginate = pages
-                yield await resp.json()
+                body = await resp.read()
+                with self.metrics.time('parse_seconds', endpoint=endpoint):
+                    data = await self.pool.decode(body, fields)
+                etag = resp.headers.get('ETag', '')
+                last_modified = resp.headers.get('Last-Modified', '')
+                if etag or last_modified:
+                    self.cache.put(key, CacheEntry(etag=etag, last_modified=last_modified,
+                                                   links=links, data=data, size=len(body)))
+                else:
+                    self.cache.pop(key)
 
-    def valid_dates(self, item, key_date='date') -> Optional[datetime]:
-        """Check date period from config and return date from key if valid or None"""
+        pages = {name: page for page, name in self.paginate_patt.findall(links)}
+        request.paginate = pages
+        return data
 
-        date = datetime.strptime(item[key_date], '%Y-%m-%dT%H:%M:%S%z')
-        if self.config.since and date < self.config.since:
-            return None
-        if self.config.until and date > self.config.until:
-            return None
-        return date
+    async def request(self, *args, fields: Fields = None, fan_out: bool = True, **kwargs):
+        """ Yield data of each page, pages after the first are requested concurrently
+        when the last page is known, `fan_out=False` walks pages one by one for stop early
+        """
+        requests = self.generate_requests(*args, **kwargs)
+        first = next(requests)
+        yield await self.fetch(first, fields)
+
+        if 'last' not in first.paginate or not fan_out:
+            # without the last page is unknown the count of pages, so walk one by one
+            for request in requests:
+                yield await self.fetch(request, fields)
+            return
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_page(page):
+            async with semaphore:
+                return await self.fetch(self.page_request(first, page), fields)
+
+        last = int(first.paginate['last'])
+        start = int(first.paginate.get('next', last))
+        tasks = [asyncio.ensure_future(fetch_page(page))
+                 for page in range(start, last + 1)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
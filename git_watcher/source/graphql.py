@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta, timezone as tz
+from typing import Any, Dict, Sequence
+
+from .abstract import AbstractProvider, Request
+
+STATE_COUNTS_QUERY = '''
+query($opened: String!, $closed: String!, $old_opened: String!) {
+  opened: search(query: $opened, type: ISSUE) { issueCount }
+  closed: search(query: $closed, type: ISSUE) { issueCount }
+  old_opened: search(query: $old_opened, type: ISSUE) { issueCount }
+}
+'''
+
+HISTORY_QUERY = '''
+query($owner: String!, $repo: String!, $branch: String!,
+      $since: GitTimestamp, $until: GitTimestamp, $after: String) {
+  repository(owner: $owner, name: $repo) {
+    ref(qualifiedName: $branch) {
+      target {
+        ... on Commit {
+          history(first: 100, after: $after, since: $since, until: $until) {
+            pageInfo { hasNextPage endCursor }
+            nodes { oid author { email date user { login } } }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+
+class GitHubGraphQL(AbstractProvider):
+    """ Provider by GitHub GraphQL API: counts of pull requests and issues are taken
+    by one search query each and commits are paginated by cursor
+    """
+    pr_edge_days = 30
+    issue_edge_days = 14
+    base_url = 'https://api.github.com/graphql'
+    history_path = ('repository', 'ref', 'target', 'history')
+
+    async def update_contributors(self):
+        variables = {
+            'owner': self.owner,
+            'repo': self.repo,
+            'branch': self.branch,
+            'since': self.since and self.since.isoformat(),
+            'until': self.until and self.until.isoformat(),
+        }
+        _contributors = self.new_contributors()
+        async for nodes in self.request(HISTORY_QUERY, variables, path=self.history_path):
+            list(self.parse_contributors(nodes, _contributors))
+
+        self.contributors = _contributors
+
+    async def update_pulls_info(self):
+        search = f'repo:{self.owner}/{self.repo} is:pr base:{self.branch} draft:false'
+        info = await self.count_states(search, self.pr_edge_days)
+        self.pulls_info.clear()
+        self.pulls_info.update({'name': 'Pulls', **info})
+
+    async def update_issues_info(self):
+        search = f'repo:{self.owner}/{self.repo} is:issue'
+        if self.since:
+            search += f' updated:>={self.since.isoformat()}'
+        info = await self.count_states(search, self.issue_edge_days)
+        self.issues_info.clear()
+        self.issues_info.update({'name': 'Issues', **info})
+
+    async def count_states(self, search: str, edge_days: int) -> Dict[str, int]:
+        """ Count sate open, closed and the open old items by one query
+        """
+        edge = (datetime.now(tz=tz.utc) - timedelta(days=edge_days)).date()
+        variables = {
+            'opened': f'{search} is:open',
+            'closed': f'{search} is:closed',
+            'old_opened': f'{search} is:open created:<{edge.isoformat()}',
+        }
+        data = await self.query(STATE_COUNTS_QUERY, variables)
+        return {name: result['issueCount'] for name, result in data.items()}
+
+    def parse_contributors(self, data, storage):
+        for commit in data:
+            git_author = commit['author']
+            hub_author = git_author.get('user')
+            if not hub_author:
+                # this a commit from local repository without github account
+                login = git_author.get('email')
+            else:
+                login = hub_author.get('login')
+
+            if not self.valid_dates(git_author, key_date='date'):
+                continue
+
+            contributor = storage.add(login, email=git_author['email'])
+            if contributor:
+                yield contributor
+
+    def generate_requests(self, query, variables, **kw):
+        request = Request('POST', self.base_url,
+                          json={'query': query, 'variables': variables}, **kw)
+        yield request
+
+        while 'after' in request.paginate:
+            variables = {**variables, 'after': request.paginate['after']}
+            request = Request('POST', self.base_url,
+                              json={'query': query, 'variables': variables}, **kw)
+            yield request
+
+    async def query(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        async for data in self.request(query, variables):
+            return data
+        return {}
+
+    async def request(self, query, variables, path: Sequence[str] = ()):
+        """ Yield data of each page, the connection by path is paginated and its nodes given
+        """
+        for request in self.generate_requests(query, variables):
+            async with self.single_request(request) as resp:
+                self.metrics.inc('pages_total', endpoint='/graphql')
+                body = await resp.read()
+            with self.metrics.time('parse_seconds', endpoint='/graphql'):
+                result = await self.pool.decode(body)
+            if result.get('errors'):
+                raise RuntimeError(f'GraphQL errors: {result["errors"]}')
+
+            data = result['data']
+            if not path:
+                yield data
+                return
+
+            for key in path:
+                data = data and data.get(key)
+            if not data:
+                return
+            if data['pageInfo']['hasNextPage']:
+                request.paginate = {'after': data['pageInfo']['endCursor']}
+            yield data['nodes']
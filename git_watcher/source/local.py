@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timezone as tz
+from typing import AsyncGenerator, Dict, Optional
+
+from .github import GitHub
+from .. import logger
+from ..objects import Watermark
+
+
+class LocalGit(GitHub):
+    """ Provider counts contributors by `git log` of a local clone (`--mirror`),
+    pull requests and issues are still loaded from GitHub API.
+
+    Each update fetches the clone and reads only commits after the head of
+    the previous update, the login of a contributor is the email of the author.
+    """
+    log_format = '%H%x00%ae%x00%aI'
+
+    def __init__(self, config, *args, **kwargs):
+        super().__init__(config, *args, **kwargs)
+        if not config.mirror:
+            raise ValueError('Path of local clone is required for the local provider')
+        self.path = config.mirror
+
+    async def git(self, *args) -> str:
+        proc = await asyncio.create_subprocess_exec(
+            'git', '-C', self.path, *args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        out, err = await proc.communicate()
+        if proc.returncode:
+            raise RuntimeError(f'git {" ".join(args)}: {err.decode().strip()}')
+        return out.decode().strip()
+
+    async def log(self, *args) -> AsyncGenerator[Dict[str, str], None]:
+        """ Stream commits of `git log` one by one, a failed `git log` raises RuntimeError
+        after the streamed commits
+        """
+        proc = await asyncio.create_subprocess_exec(
+            'git', '-C', self.path, 'log', f'--format={self.log_format}', *args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        assert proc.stdout is not None and proc.stderr is not None
+        try:
+            async for line in proc.stdout:
+                sha, email, date = line.decode().rstrip('\n').split('\0')
+                yield {'sha': sha, 'email': email, 'date': date}
+            err = await proc.stderr.read()
+            if await proc.wait():
+                raise RuntimeError(f'git log {" ".join(args)}: {err.decode().strip()}')
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+
+    async def resolve_ref(self) -> str:
+        for ref in (f'refs/remotes/origin/{self.branch}', f'refs/heads/{self.branch}'):
+            try:
+                return await self.git('rev-parse', '--verify', '--quiet', ref)
+            except RuntimeError:
+                continue
+        raise RuntimeError(f'Branch {self.branch} is not found in {self.path}')
+
+    async def is_ancestor(self, sha: str, head: str) -> bool:
+        try:
+            await self.git('merge-base', '--is-ancestor', sha, head)
+        except RuntimeError:
+            return False
+        return True
+
+    async def update_contributors(self):
+        if await self.git('remote'):
+            await self.git('fetch', '--quiet')
+        head = await self.resolve_ref()
+
+        window = self.window
+        watermark: Optional[Watermark] = self.watermark
+        if watermark and (watermark.window != window
+                          or not await self.is_ancestor(watermark.sha, head)):
+            logger.warning(f'History of {self.branch} was rewritten, count all commits')
+            watermark = None
+        if watermark and watermark.sha == head:
+            return
+
+        args = [f'{watermark.sha}..{head}' if watermark else head]
+        if self.since:
+            args.append(f'--since={self.since.isoformat()}')
+        if self.until:
+            args.append(f'--until={self.until.isoformat()}')
+
+        counted = self.new_contributors()
+        async for commit in self.log(*args):
+            list(self.parse_contributors([commit], counted))
+
+        self.watermark = Watermark(head, datetime.now(tz=tz.utc), window=window)
+        if watermark:
+            # the new commits are added only after `git log` is read to the end,
+            # a failed one leaves the contributors as they were for the retry
+            for contributor in counted.values():
+                self.contributors.add(contributor.login, email=contributor.email,
+                                      count=contributor.count)
+        else:
+            self.contributors = counted
+
+    def apply_event(self, event, payload):
+        """ Pushes are counted by `git log` of the clone on the next update, a push event
+        is keyed by login of GitHub instead of email and would count the commits twice
+        """
+        if event == 'push':
+            return False
+        return super().apply_event(event, payload)
+
+    def parse_contributors(self, data, storage):
+        for commit in data:
+            login = commit['email']
+            if not self.valid_dates(commit, key_date='date'):
+                continue
+
+            contributor = storage.add(login, email=login)
+            if contributor:
+                yield contributor
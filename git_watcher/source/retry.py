@@ -0,0 +1,72 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+__all__ = ('Backoff', 'CircuitBreaker', 'CircuitOpenError', 'GiveUpError', 'is_retryable')
+
+# the rest of client errors are not fixed by a repeat
+RETRYABLE_STATUSES = frozenset((408, 409, 425, 429))
+
+
+def is_retryable(status: int) -> bool:
+    return status >= 500 or status in RETRYABLE_STATUSES
+
+
+class GiveUpError(RuntimeError):
+    """ All attempts of a request are failed
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """ The endpoint fails too often, requests are not sent until the cooldown ends
+    """
+
+
+@dataclass
+class Backoff:
+    """ Exponential delays with full jitter, so retries of many requests do not
+    come back at the same moment
+
+    :base float: upper bound of the first delay in second
+    :cap float: max delay in second
+    """
+    base: float = 1.0
+    cap: float = 60.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """ Breaker of one endpoint: after `threshold` failed requests in a row (each one
+    after all its retries) the requests fail at once for `cooldown` seconds, then
+    the next failed request opens it again at once and a success closes it
+
+    :opened_at float: monotonic time of the last opening, None when closed
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def check(self, name: str):
+        if self.opened_at is not None and self.is_open:
+            left = self.cooldown - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(f'{name} is failing, next try in {left:.0f}s')
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            # a failed trial after the cooldown opens the breaker again
+            self.opened_at = time.monotonic()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Mapping, Optional
+
+from ..metrics import Metrics, NULL_METRICS
+
+__all__ = ('Throttler',)
+
+
+class Throttler:
+    """ Token bucket of requests which spreads the rest of API quota until its reset
+
+    The quota is learned from `X-RateLimit-*` and `Retry-After` headers of each response,
+    until that the requests go with the fixed interval.
+
+    :burst int: max count of requests which can go without delay when quota is plentiful
+    :remaining int: the rest of quota by the last response
+    :reset int: timestamp of the quota reset by the last response
+    """
+    remaining: Optional[int] = None
+    reset: Optional[int] = None
+
+    def __init__(self, interval=6.0, burst=10, metrics: Metrics = NULL_METRICS):
+        self.metrics = metrics
+        self.rate = 1 / interval
+        self.burst = burst
+        self.capacity = 1.0
+        self.tokens = 1.0
+        self.last_event_time = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def limit_exceeded(self) -> bool:
+        return self.remaining == 0 and time.time() < (self.reset or 0)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_event_time) * self.rate)
+        self.last_event_time = now
+
+    def update(self, headers: Mapping):
+        """ Adjust the rate of requests by headers of a response
+        """
+        now = time.time()
+        retry_after = headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            self.block(int(retry_after))
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        self.refill()
+        self.remaining, self.reset = int(remaining), int(reset)
+        window = max(self.reset - now, 1.0)
+        if self.remaining == 0:
+            self.tokens = 0
+            self.block(window)
+        else:
+            self.rate = self.remaining / window
+            self.capacity = max(1, min(self.burst, self.remaining))
+            self.tokens = min(self.tokens, self.capacity)
+
+    def block(self, delay: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    async def __aenter__(self):
+        async with self.lock:
+            delay = self.blocked_until - time.monotonic()
+            if delay > 0:
+                self.metrics.inc('throttle_sleep_seconds_total', delay, reason='blocked')
+                await asyncio.sleep(delay)
+
+            self.refill()
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self.metrics.inc('throttle_sleep_seconds_total', delay, reason='rate')
+                await asyncio.sleep(delay)
+                self.refill()
+            self.tokens -= 1
+
+    async def __aexit__(self, *exc_info):
+        pass
@@ -0,0 +1,30 @@
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+__all__ = ('StateStore',)
+
+
+class StateStore:
+    """ Snapshots of providers state in sqlite for warm restarts, one row by provider key
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS state ('
+                        'key TEXT PRIMARY KEY, data TEXT NOT NULL, saved_at REAL NOT NULL)')
+        self.db.commit()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute('SELECT data FROM state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, key: str, data: Dict[str, Any]):
+        self.db.execute('INSERT OR REPLACE INTO state (key, data, saved_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(data), time.time()))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
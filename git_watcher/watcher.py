@@ -1,20 +1,85 @@
 import asyncio
-from typing import List
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable, List, Optional,
+                    Sequence, Set, Tuple)
 
 from . import logger
-from .display import Throbber, Table, clear_output
-from .objects import Contributor, Statistic
-from .source import GitHub
+from .display import Throbber, Table, Renderer, snapshot
+from .objects import Contributor, ContributorStore, Statistic
+from .source import Pool, provider_class
+from .source.abstract import AbstractProvider
+from .state import StateStore
+
+if TYPE_CHECKING:
+    from .server import Server
+
+
+@dataclass
+class Schedule:
+    """ Periodic refresh of one metric, the next refresh starts only after the previous
+
+    :interval float: period in second between refreshes
+    :jitter float: part of interval added randomly for spread requests of metrics
+    """
+    name: str
+    update: Callable[[], Awaitable]
+    interval: float
+    jitter: float = 0.0
+
+    woken: Optional[asyncio.Event] = None
+
+    def delay(self) -> float:
+        return self.interval * (1 + random.uniform(0, self.jitter))
+
+    async def sleep(self):
+        """ Wait the period or until the refresh is requested by `wake`
+        """
+        try:
+            await asyncio.wait_for(self.woken.wait(), self.delay())
+        except asyncio.TimeoutError:
+            pass
+        self.woken.clear()
+
+    def wake(self):
+        if self.woken is not None:
+            self.woken.set()
 
 
 class Watcher:
+    """ Dashboard of one or many repositories, providers of all repositories share
+    one pool of connections and one budget of API requests.
+
+    Refreshes of many repositories wait for free slots in order of their turn,
+    so a large repository does not hold back the others. Statistic of many
+    repositories is shown by pages with totals and contributors are summed.
+    """
     throbber: Throbber
     contributors: List[Contributor]
-    statistic: List[Statistic]
+    # rows of the statistic table, the dicts of providers which are updated in place
+    statistic: List[Dict]
+    schedules: List[Schedule]
+    refreshed: Set[str]
+    versions: Counter
+    providers: List[AbstractProvider]
+    slots: Optional[asyncio.Semaphore] = None
+    state: Optional[StateStore] = None
+    server: Optional['Server'] = None
+    serialized: Optional[Tuple[Tuple[int, int], str, bytes]]
+    page_interval = 5.0
 
     def __init__(self, config):
-        self.provider = GitHub(config)
         self.config = config
+        self.pool = Pool(config)
+        provider_cls = provider_class(config.provider)
+        self.providers = [provider_cls(config, dest, self.pool) for dest in config.dests]
+        self.provider = self.providers[0]
+        self.multi = len(self.providers) > 1
         self.throbber = Throbber()
 
         self.contributors = [Contributor('-')]
@@ -22,36 +87,266 @@ class Watcher:
                           self.provider.issues_info]
         self.first_boot = True
 
-    async def update(self):
+        jitter = config.update_jitter
+        # webhooks keep metrics fresh, the polls only reconcile missed events
+        interval = config.reconcile_interval if config.webhooks else config.update_interval
+        self.schedules = []
+        for provider in self.providers:
+            prefix = f'{provider.owner}/{provider.repo} ' if self.multi else ''
+            self.schedules += [
+                Schedule(f'{prefix}pulls', provider.update_pulls_info,
+                         config.pulls_interval or interval, jitter),
+                Schedule(f'{prefix}issues', provider.update_issues_info,
+                         config.issues_interval or interval, jitter),
+                Schedule(f'{prefix}contributors', partial(self.update_contributors, provider),
+                         config.contributors_interval or interval, jitter),
+            ]
+        self.refreshed = set()
+        self.versions = Counter()
+        self.started = int(time.time())
+        self.serialized = None
+        self.renderer = Renderer()
+        if config.state_file:
+            self.state = StateStore(config.state_file)
+        if config.http_port:
+            from .server import Server
+            self.server = Server(self, config.http_host, config.http_port,
+                                 webhook_secret=config.webhook_secret, webhooks=config.webhooks,
+                                 metrics=config.metrics, serve=config.serve,
+                                 window_token=config.window_token)
+
+    async def update_contributors(self, provider: Optional[AbstractProvider] = None):
+        provider = provider or self.provider
+        await provider.update_contributors()
+        self.refresh_top(provider)
+
+    def refresh_top(self, provider: AbstractProvider):
+        if self.multi:
+            return self.merge_contributors()
+
+        top = provider.contributors.top
+        moved = top.pop_moved()
+        if moved or len(self.contributors) != len(top.items):
+            self.contributors = provider.get_top_contributors()
+            self.versions['top'] += 1
+
+    def merge_contributors(self):
+        """ Sum contributors of all repositories by login
+        """
+        merged = ContributorStore(self.config.size_top_table)
+        for provider in self.providers:
+            for c in provider.contributors.values():
+                if c.count:
+                    merged.add(c.login, email=c.email, count=c.count)
+        top = merged.top_contributors(self.config.size_top_table)
+
+        previous = {c.login: (i, c.count) for i, c in enumerate(self.contributors)}
+        moved = {c.login for i, c in enumerate(top) if previous.get(c.login) != (i, c.count)}
+        moved |= previous.keys() - {c.login for c in top}
+        if moved:
+            self.contributors = top
+            self.versions['top'] += 1
+
+    def apply_event(self, full_name: str, event: str, payload: Dict) -> bool:
+        """ Apply an event of webhook to the provider of repository, the polls of
+        the provider keep going with the interval of reconciliation
+        """
+        for provider in self.providers:
+            if f'{provider.owner}/{provider.repo}'.lower() != full_name.lower():
+                continue
+            if not provider.apply_event(event, payload):
+                return False
+            self.versions['statistic'] += 1
+            if event == 'push':
+                self.refresh_top(provider)
+            return True
+        return False
+
+    def set_window(self, since: Optional[datetime], until: Optional[datetime]) -> List[str]:
+        """ Change the window of all repositories at runtime, the contributors counted
+        by day are answered at once and all metrics are refreshed without waiting the period
+
+        :return: repositories which contributors are answered by the daily counts
+        """
+        answered = [f'{p.owner}/{p.repo}' for p in self.providers if p.set_window(since, until)]
+        self.refresh_top(self.provider)
+        self.versions['statistic'] += 1
+        for schedule in self.schedules:
+            schedule.wake()
+        return answered
+
+    def top_contributors(self, since: Optional[datetime],
+                         until: Optional[datetime]) -> Optional[List[Contributor]]:
+        """ Top contributors of all repositories for any range of whole days (weeks when
+        counted by the statistic of GitHub) inside of the counted ones, None if a repository
+        has not counted the range
+        """
+        merged = ContributorStore(self.config.size_top_table)
+        for provider in self.providers:
+            daily = getattr(provider, 'daily', None)
+            if daily is None or not daily.covers(since, until):
+                return None
+            for c in daily.store(since, until, self.config.size_top_table).values():
+                merged.add(c.login, email=c.email, count=c.count)
+        return merged.top_contributors(self.config.size_top_table)
+
+    async def refresh(self, schedule: Schedule):
+        metrics = self.pool.metrics
+        schedule.woken = asyncio.Event()
         while True:
-            await self.provider.update_pulls_info()
-            await self.provider.update_issues_info()
-            await self.provider.update_contributors()
+            try:
+                with metrics.time('refresh_seconds', metric=schedule.name):
+                    if self.slots is None:
+                        await schedule.update()
+                    else:
+                        async with self.slots:
+                            await schedule.update()
+            except Exception as ex:
+                # the data of the last successful refresh is kept until the next period,
+                # a cancel of the watcher is not an Exception and goes through
+                logger.warning(f'Refresh of {schedule.name} is failed: {ex!r}')
+                metrics.inc('refresh_errors_total', metric=schedule.name)
+                await schedule.sleep()
+                continue
 
+            self.refreshed.add(schedule.name)
+            self.versions['statistic'] += 1
+            self.first_boot = len(self.refreshed) < len(self.schedules)
+            await schedule.sleep()
+
+    def restore(self):
+        """ Load the last saved state of providers for the first paint
+        """
+        if self.state is None:
+            return
+        restored = False
+        for provider in self.providers:
+            data = self.state.load(provider.state_key())
+            if data:
+                provider.load_state(data)
+                restored = True
+        if not restored:
+            return
+
+        self.versions['statistic'] += 1
+        if self.multi:
+            self.merge_contributors()
+        else:
+            self.provider.contributors.top.pop_moved()
             self.contributors = self.provider.get_top_contributors()
+            self.versions['top'] += 1
 
-            self.first_boot = False
+    def save(self):
+        self.pool.cache.save()
+        if self.state is not None:
+            for provider in self.providers:
+                self.state.save(provider.state_key(), provider.dump_state())
+
+    async def persist(self):
+        while True:
             await asyncio.sleep(self.config.update_interval)
+            self.save()
+
+    async def update(self):
+        if self.multi:
+            self.slots = asyncio.Semaphore(max(1, self.config.parallel_repos))
+        await asyncio.gather(self.persist(), *(self.refresh(s) for s in self.schedules))
+
+    def statistic_page(self, page: int, size: Optional[int] = None) -> List[Dict]:
+        """ Totals of all repositories and the rows of repositories on the page
+        """
+        totals = []
+        for name, key in (('All pulls', 'pulls_info'), ('All issues', 'issues_info')):
+            total: Dict[str, Any] = {'name': name}
+            for column in Statistic.columns():
+                values = [getattr(p, key).get(column) for p in self.providers]
+                if column != 'name' and any(isinstance(v, int) for v in values):
+                    total[column] = sum(v for v in values if isinstance(v, int))
+            totals.append(total)
+
+        size = size or max(1, self.config.page_size)
+        rows = []
+        for p in self.providers[page * size:(page + 1) * size]:
+            rows += [{**p.pulls_info, 'name': f'{p.owner}/{p.repo} pulls'},
+                     {**p.issues_info, 'name': f'{p.owner}/{p.repo} issues'}]
+        return totals + rows
+
+    def snapshot(self) -> Tuple[str, bytes]:
+        """ ETag and JSON of the dashboard for the HTTP API, the JSON is serialized
+        again only after a change, so reads cost nothing and never wait for a refresh
+        """
+        version = (self.versions['statistic'], self.versions['top'])
+        if self.serialized is None or self.serialized[0] != version:
+            rows = self.statistic_page(0, len(self.providers)) if self.multi else self.statistic
+            data = {
+                'version': version,
+                'repositories': [f'{p.owner}/{p.repo}' for p in self.providers],
+                'loading': self.first_boot,
+                'statistic': [dict(row) for row in rows],
+                'contributors': [c.asdict() for c in self.contributors if c.count],
+            }
+            # the id of start keeps ETags of the previous run from matching
+            etag = f'"{self.started}-{version[0]}-{version[1]}"'
+            self.serialized = (version, etag, json.dumps(data).encode())
+        return self.serialized[1], self.serialized[2]
+
+    def frame(self) -> str:
+        title = 'Statistic Info'
+        rows: Sequence = self.statistic
+        version: Hashable = self.versions['statistic']
+        if self.multi:
+            size = max(1, self.config.page_size)
+            pages = (len(self.providers) + size - 1) // size
+            page = int(time.monotonic() / self.page_interval) % pages
+            title = f'Statistic Info (page {page + 1}/{pages})'
+            rows = self.statistic_page(page)
+            version = (self.versions['statistic'], page)
+
+        table_statistic = self.renderer.cached('statistic', version,
+                                               lambda: str(Table(Statistic, rows)))
+        table = self.renderer.cached('top', self.versions['top'],
+                                     lambda: str(Table(Contributor, self.contributors)))
+        return (f'{title}:\n'
+                f'{table_statistic}\n\n'
+                f'Top contributors:\n'
+                f'{table}\n')
 
     async def display(self):
-        while True:
-            await asyncio.sleep(0.3)
-            clear_output()
+        last_frame = None
+        if self.config.debug:
+            self.renderer.capture_logs()
+        try:
+            while True:
+                await asyncio.sleep(0.3)
 
-            info_status = 'Ø' if self.provider.limit_exceeded else ''
-            table_statistic = Table(Statistic, self.statistic)
-            table = Table(Contributor, self.contributors)
+                info_status = 'Ø' if self.provider.limit_exceeded else ''
+                if self.provider.rate_remaining is not None:
+                    info_status += f' quota: {self.provider.rate_remaining}'
+                status = self.first_boot and 'Loading ...' or ' '
 
-            status = self.first_boot and 'Loading ...' or ' '
-            logger.info(f'Statistic Info:\n'
-                        f'{table_statistic}\n\n'
-                        f'Top contributors:\n'
-                        f'{table}\n\n'
-                        f'''{self.throbber} | {status}'''
-                        f'{info_status}')
+                frame = self.frame()
+                if frame != last_frame:
+                    snapshot(frame)
+                    last_frame = frame
+                if self.config.debug:
+                    self.renderer.draw(frame.splitlines(),
+                                       f'{self.throbber} | {status}{info_status}')
+        finally:
+            self.renderer.close()
 
     async def run(self):
-        await asyncio.gather(
-            self.update(),
-            self.display(),
-        )
+        self.restore()
+        try:
+            if self.server is not None:
+                await self.server.start()
+            async with self.pool:
+                await asyncio.gather(
+                    self.update(),
+                    self.display(),
+                )
+        finally:
+            if self.server is not None:
+                await self.server.close()
+            self.save()
+            if self.state is not None:
+                self.state.close()
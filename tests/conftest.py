@@ -20,16 +20,45 @@ def _config():
     parser = argparse.ArgumentParser()
     parser.add_argument('--dest', type=Destination.from_str, metavar='url',
                         default='https://github.com/TestAuthor/testProject')
+    parser.add_argument('--provider', type=str, default='github')
+    parser.add_argument('--mirror', type=str, default='')
+    parser.add_argument('--contributors-source', type=str, default='commits')
     parser.add_argument('--branch', type=str, default='master', required=False)
     parser.add_argument('--since', type=datetime, default=None, required=False)
     parser.add_argument('--until', type=datetime, default=None)
     parser.add_argument('--no-debug', default=True, dest='debug', action='store_false')
     parser.add_argument('--auth', default='', type=str)
+    parser.add_argument('--auth-file', default='', type=str)
     parser.add_argument('--update-interval', default=600, type=int)
+    parser.add_argument('--pulls-interval', default=None, type=int)
+    parser.add_argument('--issues-interval', default=None, type=int)
+    parser.add_argument('--contributors-interval', default=None, type=int)
+    parser.add_argument('--update-jitter', default=0.1, type=float)
     parser.add_argument('--size-top-table', default=30, type=int)
+    parser.add_argument('--concurrency', default=4, type=int)
+    parser.add_argument('--pool-size', default=10, type=int)
+    parser.add_argument('--pool-size-per-host', default=0, type=int)
+    parser.add_argument('--dns-cache-ttl', default=300, type=int)
+    parser.add_argument('--request-timeout', default=60, type=int)
+    parser.add_argument('--cache-file', default='', type=str)
+    parser.add_argument('--cache-size', default=64, type=int)
+    parser.add_argument('--state-file', default='', type=str)
+    parser.add_argument('--parse-workers', default=0, type=int)
+    parser.add_argument('--parse-executor', default='thread', type=str)
+    parser.add_argument('--parallel-repos', default=4, type=int)
+    parser.add_argument('--page-size', default=10, type=int)
+    parser.add_argument('--http-port', default=0, type=int)
+    parser.add_argument('--http-host', default='127.0.0.1', type=str)
+    parser.add_argument('--webhooks', default=False, action='store_true')
+    parser.add_argument('--webhook-secret', default='', type=str)
+    parser.add_argument('--reconcile-interval', default=3600, type=int)
+    parser.add_argument('--metrics', default=False, action='store_true')
+    parser.add_argument('--serve', default=False, action='store_true')
+    parser.add_argument('--window-token', default='', type=str)
 
     parser.set_defaults(url='https://github.com/TestAuthor/testProject')
     args, _ = parser.parse_known_args()
+    args.dests = [args.dest]
 
     with patch('git_watcher.config.base_parser') as conf:
         conf.return_value = args
@@ -40,6 +69,7 @@ def _config():
 async def github(_config):
     github = GitHub(_config)
     yield github
+    await github.close()
 
 
 @pytest.fixture(scope="session")
@@ -51,10 +81,14 @@ def _fixture_contrib_data():
 
 @pytest.fixture()
 def patch_request_contrib(_fixture_contrib_data):
-    with patch('git_watcher.source.github.GitHub.single_request') as mk:
-        mk.return_value.__aenter__.return_value.headers = {}
-        mk.return_value.__aenter__.return_value.json.return_value = _fixture_contrib_data
-        yield
+    # the branch is not default, so contributors are counted by commits
+    with patch('git_watcher.source.github.GitHub.is_default_branch', return_value=False), \
+            patch('git_watcher.source.github.GitHub.single_request') as mk:
+        resp = mk.return_value.__aenter__.return_value
+        resp.status = 200
+        resp.headers = {}
+        resp.read.return_value = json.dumps(_fixture_contrib_data).encode()
+        yield mk
 
 
 @pytest.fixture()
@@ -63,22 +97,28 @@ def patch_session_request():
         yield rq
 
 
+class ResponseStub(list):
+    headers: dict = {}
+    status = 200
+
+
 class UnstableRequester:
     """ For multiple requests context in the patch side effect
     with unsuccess requests and unsuccessful after
 
     """
 
-    def __init__(self, raise_fails=1, return_value=None):
+    def __init__(self, raise_fails=1, return_value=None, status=502):
         self.raise_fails = raise_fails
+        self.status = status
         self.count_raise = 0
         self.return_value = return_value
 
     async def __aenter__(self):
         if self.raise_fails > self.count_raise:
             self.count_raise += 1
-            raise ClientResponseError(RequestInfo('', '', Mock(), ''), ())
-        return self.return_value or {}
+            raise ClientResponseError(RequestInfo('', '', Mock(), ''), (), status=self.status)
+        return ResponseStub(self.return_value or [])
 
     async def __aexit__(self, exc_type, exc, tb):
         return self.return_value or {}
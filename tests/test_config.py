@@ -0,0 +1,31 @@
+import pytest
+
+from git_watcher.config import base_parser
+
+URL = 'https://github.com/owner/repo'
+
+
+def test_webhooks_require_secret(monkeypatch):
+    monkeypatch.delenv('GIT_WATCHER_WEBHOOK_SECRET', raising=False)
+    with pytest.raises(SystemExit):
+        base_parser([URL, '--webhooks', '--http-port', '8080'])
+    assert base_parser([URL, '--webhooks', '--http-port', '8080', '--webhook-secret', 's']).webhooks
+
+    monkeypatch.setenv('GIT_WATCHER_WEBHOOK_SECRET', 's')
+    assert base_parser([URL, '--webhooks', '--http-port', '8080']).webhook_secret == 's'
+
+
+@pytest.mark.parametrize('option', ['--webhooks', '--metrics', '--serve'])
+def test_server_options_require_port(monkeypatch, option):
+    monkeypatch.setenv('GIT_WATCHER_WEBHOOK_SECRET', 's')
+    with pytest.raises(SystemExit):
+        base_parser([URL, option])
+    assert getattr(base_parser([URL, option, '--http-port', '8080']), option[2:])
+
+
+def test_contributors_source():
+    # the statistic skips authors without GitHub account, so it is not the default
+    assert base_parser([URL]).contributors_source == 'commits'
+    assert base_parser([URL, '--contributors-source', 'stats']).contributors_source == 'stats'
+    with pytest.raises(SystemExit):
+        base_parser([URL, '--contributors-source', 'graphql'])
@@ -0,0 +1,62 @@
+import logging
+from io import StringIO
+
+from git_watcher.display import Renderer
+
+
+def test_renderer_redraws_changed_lines():
+    stream = StringIO()
+    renderer = Renderer(stream, ansi=True)
+    renderer.draw(['a', 'b', 'c'], 'status 1')
+    assert stream.getvalue().startswith(Renderer.HIDE_CURSOR + Renderer.CLEAR)
+
+    stream.seek(0)
+    stream.truncate()
+    renderer.draw(['a', 'B', 'c'], 'status 2')
+    assert stream.getvalue() == '\x1b[2;1HB\x1b[K\x1b[4;1Hstatus 2\x1b[K'
+
+    stream.seek(0)
+    stream.truncate()
+    renderer.draw(['a'], 'status 2')
+    assert stream.getvalue() == '\x1b[2;1Hstatus 2\x1b[K\x1b[3;1H\x1b[J'
+
+
+def test_renderer_without_terminal():
+    stream = StringIO()
+    renderer = Renderer(stream, ansi=False)
+    renderer.draw(['a', 'b'], 'status 1')
+    renderer.draw(['a', 'b'], 'status 2')
+    renderer.draw(['a', 'c'], 'status 3')
+    assert stream.getvalue() == 'a\nb\na\nc\n'
+
+
+def test_renderer_cache():
+    renderer = Renderer(StringIO())
+    calls = []
+
+    def render():
+        calls.append(1)
+        return 'table'
+
+    for version in (1, 1, 1, 2, 2):
+        assert renderer.cached('table', version, render) == 'table'
+    assert len(calls) == 2
+
+
+def test_renderer_captures_logs():
+    stream = StringIO()
+    root = logging.getLogger()
+    console = logging.StreamHandler(stream)
+    root.addHandler(console)
+    renderer = Renderer(stream, ansi=True)
+    try:
+        renderer.capture_logs()
+        assert console not in root.handlers
+        logging.getLogger(__name__).warning('retry in 1s\ntraceback')
+        renderer.draw(['a'], 'status')
+        assert renderer.lines == ['a', 'status', 'retry in 1s']
+        assert 'traceback' not in stream.getvalue()
+    finally:
+        renderer.close()
+        assert console in root.handlers and renderer.last_record not in root.handlers
+        root.removeHandler(console)
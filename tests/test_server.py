@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import hmac
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from git_watcher.objects import DailyCounts, ItemStates, Watermark
+from git_watcher.server import Server
+from git_watcher.watcher import Watcher
+
+SECRET = 'secret'
+
+
+def payload(name):
+    return (Path(__file__).with_name('fixtures') / f'webhook_{name}.json').read_bytes()
+
+
+def signed(body, secret=SECRET):
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return f'sha256={digest}'
+
+
+@pytest.fixture()
+async def webhook(_config):
+    config = argparse.Namespace(**vars(_config))
+    config.http_port = 1
+    config.webhooks = True
+    config.metrics = True
+    config.serve = True
+    config.webhook_secret = SECRET
+    config.window_token = 'token'
+    watcher = Watcher(config)
+    provider = watcher.provider
+    now = datetime.now(tz=timezone.utc)
+    old = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+    provider.pull_states = ItemStates(provider.window)
+    provider.pull_states.set(1, True, now.timestamp())
+    provider.issue_states = ItemStates(provider.window)
+    for number, is_open in ((7, True), (9, True), (2, False), (3, False), (4, False)):
+        provider.issue_states.set(number, is_open, old)
+    for states in (provider.pull_states, provider.issue_states):
+        states.cursor = now
+    provider.pulls_info.update(opened=1, closed=0, old_opened=0)
+    provider.issues_info.update(opened=2, closed=3, old_opened=2)
+    provider.watermark = Watermark('a' * 40, datetime(2020, 2, 1, tzinfo=timezone.utc))
+
+    client = TestClient(TestServer(watcher.server.app))
+    await client.start_server()
+    yield watcher, client
+    await client.close()
+    await watcher.pool.close()
+
+
+async def post(client, event, body, signature=None):
+    headers = {'X-GitHub-Event': event,
+               'X-Hub-Signature-256': signature or signed(body)}
+    resp = await client.post('/webhook', data=body, headers=headers)
+    return resp.status, await resp.json()
+
+
+@pytest.mark.asyncio
+async def test_webhook_signature(webhook):
+    watcher, client = webhook
+    assert watcher.schedules[0].interval == 3600
+
+    status, _ = await post(client, 'push', payload('push'), signature=signed(b'', 'wrong'))
+    assert status == 401
+    status, data = await post(client, 'ping', b'{"zen": "Keep it simple."}')
+    assert (status, data['applied']) == (200, False)
+
+    # a server without the secret accepts no events
+    server = Server(watcher)
+    client = TestClient(TestServer(server.app))
+    await client.start_server()
+    status, _ = await post(client, 'push', payload('push'), signature='sha256=')
+    assert status == 401
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_events(webhook):
+    watcher, client = webhook
+    provider = watcher.provider
+
+    status, data = await post(client, 'push', payload('push'))
+    assert (status, data['applied']) == (200, True)
+    assert [(c.login, c.count) for c in watcher.contributors if c.count] == \
+        [('alice', 1), ('local@mail.com', 1)]
+    assert provider.watermark.pushed == {'b' * 40, 'c' * 40}
+
+    # a redelivery of the same push is not counted twice
+    await post(client, 'push', payload('push'))
+    assert provider.contributors['alice'].count == 1
+
+    await post(client, 'pull_request', payload('pull_request'))
+    assert provider.pulls_info == {'name': 'Pulls', 'opened': 2, 'closed': 0, 'old_opened': 1}
+    await post(client, 'issues', payload('issues'))
+    assert provider.issues_info == {'name': 'Issues', 'opened': 1, 'closed': 4, 'old_opened': 1}
+
+    body = json.loads(payload('pull_request'))
+    body['pull_request']['base']['ref'] = 'develop'
+    _, data = await post(client, 'pull_request', json.dumps(body).encode())
+    assert not data['applied']
+
+
+@pytest.mark.asyncio
+async def test_webhook_push_by_stats(webhook):
+    watcher, client = webhook
+    provider = watcher.provider
+    provider.config.contributors_source = 'stats'
+    stats = [{'author': {'login': 'alice'}, 'weeks': [{'w': 1580601600, 'c': 2}]}]
+    with patch.object(provider, 'fetch', AsyncMock(return_value=stats)), \
+            patch.object(provider, 'is_default_branch', AsyncMock(return_value=True)):
+        await provider.update_contributors()
+    assert provider.watermark is None
+
+    status, data = await post(client, 'push', payload('push'))
+    assert (status, data['applied']) == (200, True)
+    # the author without GitHub account is not in the statistic
+    assert [(c.login, c.count) for c in watcher.contributors if c.count] == [('alice', 3)]
+    assert provider.daily.count('alice') == 3
+    await post(client, 'push', payload('push'))
+    assert provider.contributors['alice'].count == 3
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(webhook):
+    watcher, client = webhook
+    metrics = watcher.pool.metrics
+    metrics.inc('pages_total', endpoint='/commits')
+    metrics.observe('request_seconds', 0.02, endpoint='/commits')
+
+    resp = await client.get('/metrics')
+    text = await resp.text()
+    assert 'git_watcher_pages_total{endpoint="/commits"} 1' in text
+    assert 'git_watcher_request_seconds_bucket{endpoint="/commits",le="0.025"} 1' in text
+    assert 'git_watcher_request_seconds_count{endpoint="/commits"} 1' in text
+
+    resp = await client.get('/metrics.json')
+    data = await resp.json()
+    assert data['request_seconds'][0]['buckets']['0.01'] == 0
+
+
+@pytest.mark.asyncio
+async def test_snapshot(webhook):
+    watcher, client = webhook
+    resp = await client.get('/snapshot')
+    etag = resp.headers['ETag']
+    data = await resp.json()
+    assert data['statistic'][0] == {'name': 'Pulls', 'opened': 1, 'closed': 0, 'old_opened': 0}
+    assert data['contributors'] == []
+
+    resp = await client.get('/snapshot', headers={'If-None-Match': etag})
+    assert resp.status == 304
+
+    await post(client, 'push', payload('push'))
+    resp = await client.get('/snapshot', headers={'If-None-Match': etag})
+    assert resp.status == 200
+    assert resp.headers['ETag'] != etag
+    data = await resp.json()
+    assert data['contributors'][0] == {'login': 'alice', 'count': 1, 'email': 'alice@mail.com'}
+
+
+@pytest.mark.asyncio
+async def test_window_api(webhook):
+    watcher, client = webhook
+    resp = await client.get('/contributors', params={'since': '2020-02-02'})
+    assert resp.status == 409
+
+    provider = watcher.provider
+    provider.daily = DailyCounts()
+    provider.daily.add('a', 'a@a', datetime(2020, 2, 2, 10, tzinfo=timezone.utc), 3)
+    provider.daily.add('b', 'b@b', datetime(2020, 2, 5, 10, tzinfo=timezone.utc))
+    resp = await client.get('/contributors', params={'since': '2020-02-03'})
+    assert await resp.json() == [{'login': 'b', 'count': 1, 'email': 'b@b'}]
+    resp = await client.get('/contributors', params={'since': 'yesterday'})
+    assert resp.status == 400
+
+    window = {'since': '2020-02-01', 'until': '2020-02-03'}
+    resp = await client.put('/window', json=window, headers={'Authorization': 'Bearer wrong'})
+    assert resp.status == 401
+    resp = await client.put('/window', json=window, headers={'Authorization': 'Bearer token'})
+    assert await resp.json() == {'answered': ['TestAuthor/testProject']}
+    assert [(c.login, c.count) for c in watcher.contributors] == [('a', 3)]
+    assert provider.since == datetime(2020, 2, 1, tzinfo=timezone.utc)
+    provider.set_window(None, None)
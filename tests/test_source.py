@@ -1,9 +1,26 @@
-from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+from aiohttp import web, ClientResponseError
+from aiohttp.test_utils import TestServer
 
-from git_watcher.objects import Contributor
-from git_watcher.source import Request
+from git_watcher.display import Table
+from git_watcher.objects import Contributor, ContributorStore, DailyCounts, Watermark, day_of
+from git_watcher.source import Request, GitHub, GitHubGraphQL, LocalGit
+from git_watcher.source.abstract import Pool, Throttler
+from git_watcher.source.cache import CacheEntry, ResponseCache
+from git_watcher.source.credentials import Credentials
+from git_watcher.source.decode import decode_page, parse_iso
+from git_watcher.source.retry import Backoff, CircuitOpenError, GiveUpError
 from .conftest import UnstableRequester
 
 
@@ -12,13 +29,221 @@ async def test_filter_contributors(_config, github, patch_request_contrib):
     await github.update_contributors()
     assert len(github.contributors) == 3
 
-    github.config.since = datetime.fromisoformat('2020-02-02T01:00:00+00:00')
-    github.config.until = datetime.fromisoformat('2020-02-02T02:00:00+00:00')
+    assert not github.set_window(datetime.fromisoformat('2020-02-02T01:00:00+00:00'),
+                                 datetime.fromisoformat('2020-02-02T02:00:00+00:00'))
 
     await github.update_contributors()
     assert len(github.contributors) == 2
 
 
+def pages(*data):
+    async def generate():
+        for page in data:
+            yield page
+    return generate()
+
+
+@pytest.mark.asyncio
+async def test_incremental_contributors(github, patch_request_contrib):
+    github.config.since = github.config.until = github.since = github.until = None
+    with patch.object(github, 'compare_commits', AsyncMock(side_effect=lambda sha: pages([]))):
+        await github.update_contributors()
+        counts = {k: c.count for k, c in github.contributors.items()}
+        assert github.watermark.seen == {'4'}
+        requests = patch_request_contrib.call_count
+
+        await github.update_contributors()
+        assert {k: c.count for k, c in github.contributors.items()} == counts
+        github.compare_commits.assert_called_once_with(github.watermark.sha)
+        assert patch_request_contrib.call_count == requests
+
+        github.compare_commits.side_effect = None
+        github.compare_commits.return_value = None
+        github.contributors['TestAuthor1'].count = 100
+        await github.update_contributors()
+        assert {k: c.count for k, c in github.contributors.items()} == counts
+        assert 'since' not in patch_request_contrib.call_args[0][0].kwargs['params']
+
+
+@pytest.mark.asyncio
+async def test_merged_commits(github, patch_request_contrib):
+    github.set_window(None, None)
+    await github.update_contributors()
+    counts = {k: c.count for k, c in github.contributors.items()}
+    watermark = github.watermark
+
+    def commit(sha, login, date):
+        return {'sha': sha, 'author': {'login': login},
+                'commit': {'author': {'email': f'{login}@mail', 'date': date},
+                           'committer': {'date': date}}}
+
+    # the commit of a branch is older than the last update and comes by the merge
+    merged = [commit('5', 'Merged', '2020-01-01T00:00:00Z'),
+              commit('6', 'TestAuthor1', '2020-02-03T00:00:00Z')]
+    compare_commits = AsyncMock(return_value=pages(merged))
+    with patch.object(github, 'compare_commits', compare_commits):
+        await github.update_contributors()
+    compare_commits.assert_called_once_with(watermark.sha)
+    assert github.contributors['Merged'].count == 1
+    assert github.contributors['TestAuthor1'].count == counts['TestAuthor1'] + 1
+    assert github.watermark.sha == '6'
+    assert github.daily.count('Merged') == 1
+
+    compare = {'status': 'ahead', 'commits': merged}
+    with patch.object(github, 'fetch', AsyncMock(return_value=compare)):
+        assert [page async for page in await github.compare_commits('4')] == [merged]
+        github.fetch.return_value = {'status': 'diverged', 'commits': []}
+        assert await github.compare_commits('4') is None
+
+
+@pytest.mark.asyncio
+async def test_failed_page_of_compare(github, patch_request_contrib):
+    github.set_window(None, None)
+    await github.update_contributors()
+    counts = {k: c.count for k, c in github.contributors.items()}
+    watermark = github.watermark
+    date = '2020-02-03T00:00:00Z'
+    commit = {'sha': '5', 'author': {'login': 'A'},
+              'commit': {'author': {'email': 'a@mail', 'date': date}, 'committer': {'date': date}}}
+
+    async def failed():
+        yield [commit]
+        raise GiveUpError('give up')
+
+    compare_commits = AsyncMock(side_effect=[failed(), pages([commit])])
+    with patch.object(github, 'compare_commits', compare_commits):
+        with pytest.raises(GiveUpError):
+            await github.update_contributors()
+        assert {k: c.count for k, c in github.contributors.items()} == counts
+        assert github.watermark is watermark
+
+        await github.update_contributors()
+    assert compare_commits.call_args_list[1][0] == (watermark.sha,)
+    assert github.contributors['A'].count == 1
+    assert github.daily.count('A') == 1
+
+
+@pytest.mark.asyncio
+async def test_push_during_poll(_config):
+    github = GitHub(argparse.Namespace(**{**vars(_config), 'webhooks': True}))
+    github.set_window(None, None)
+    github.daily = DailyCounts()
+    github.watermark = Watermark('a' * 40, datetime(2020, 2, 1, tzinfo=timezone.utc),
+                                 window=github.counted_window())
+    date = '2020-02-02T00:00:00Z'
+    commit = {'sha': 'b' * 40, 'author': {'login': 'octocat'},
+              'commit': {'author': {'email': 'o@mail', 'date': date}, 'committer': {'date': date}}}
+    push = {'ref': f'refs/heads/{github.branch}', 'after': 'c' * 40,
+            'commits': [{'id': 'b' * 40, 'timestamp': date,
+                         'author': {'username': 'octocat', 'email': 'o@mail'}}]}
+
+    async def compare():
+        yield [commit]
+        # the event of the listed commit comes while the poll goes on
+        github.apply_event('push', push)
+        yield []
+
+    with patch.object(github, 'compare_commits', AsyncMock(side_effect=lambda sha: compare())):
+        await github.update_contributors()
+    assert github.contributors['octocat'].count == 1
+    # and after the poll
+    github.apply_event('push', {**push, 'after': 'd' * 40})
+    assert github.contributors['octocat'].count == 1
+    assert github.daily.count('octocat') == 1
+    await github.close()
+
+
+@pytest.mark.asyncio
+async def test_window_by_daily_counts(github, patch_request_contrib):
+    github.set_window(None, None)
+    day = datetime(2020, 2, 2, tzinfo=timezone.utc)
+    with patch.object(github, 'compare_commits', AsyncMock(side_effect=lambda sha: pages([]))):
+        await github.update_contributors()
+        counts = {k: c.count for k, c in github.contributors.items()}
+        requests = patch_request_contrib.call_count
+
+        assert github.set_window(day, day + timedelta(days=1))
+        assert {k: c.count for k, c in github.contributors.items()} == counts
+        assert github.set_window(day + timedelta(days=1), None)
+        assert not github.contributors
+        assert patch_request_contrib.call_count == requests
+
+        # the counted range is kept by the next updates
+        await github.update_contributors()
+        github.compare_commits.assert_called_once()
+        assert patch_request_contrib.call_count == requests
+        assert not github.contributors
+
+        assert not github.set_window(day + timedelta(hours=1), None)
+    github.set_window(None, None)
+
+
+def test_daily_counts():
+    daily = DailyCounts(since=datetime(2020, 1, 1, tzinfo=timezone.utc))
+    for login, day, count in (('a', 1, 2), ('a', 3, 1), ('b', 2, 5), ('a', 10, 4)):
+        daily.add(login, f'{login}@mail', datetime(2020, 1, day, 12, tzinfo=timezone.utc), count)
+    assert daily.count('a') == 7
+    assert daily.count('a', day_of(datetime(2020, 1, 2, tzinfo=timezone.utc))) == 5
+
+    since = datetime(2020, 1, 2, tzinfo=timezone.utc)
+    until = datetime(2020, 1, 10, tzinfo=timezone.utc)
+    store = daily.store(since, until, 2)
+    assert [(c.login, c.count) for c in store.top_contributors(2)] == [('b', 5), ('a', 1)]
+    assert daily.covers(since, until) and daily.covers(since, None)
+    assert not daily.covers(None, until)
+    assert not daily.covers(since + timedelta(hours=1), until)
+    assert DailyCounts.load(json.loads(json.dumps(daily.dump()))).store(since, until, 2) == store
+
+
+@pytest.mark.asyncio
+async def test_contributors_by_stats(_config):
+    github = GitHub(argparse.Namespace(**{**vars(_config), 'contributors_source': 'stats'}))
+    week = 7 * 24 * 3600
+    sunday = 1580601600  # 2020-02-02T00:00:00Z
+    stats = [{'author': {'login': 'A'}, 'total': 6,
+              'weeks': [{'w': sunday - week, 'c': 1}, {'w': sunday, 'c': 2},
+                        {'w': sunday + week, 'c': 3}]},
+             {'author': {'login': 'B'}, 'total': 1, 'weeks': [{'w': sunday - week, 'c': 1}]},
+             {'author': None, 'total': 5, 'weeks': [{'w': sunday, 'c': 5}]}]
+    fetch = AsyncMock(side_effect=[{}, stats, stats])
+    github.stats_poll_interval = 0
+    since = datetime.fromtimestamp(sunday, tz=timezone.utc)
+    github.set_window(since, None)
+    with patch.object(github, 'fetch', fetch), \
+            patch.object(github, 'is_default_branch', AsyncMock(return_value=True)):
+        await github.update_contributors()
+        assert {k: c.count for k, c in github.contributors.items()} == {'A': 5}
+
+        # the weeks are kept, a window of whole weeks is answered without requests
+        assert github.set_window(since, since + timedelta(days=7))
+        assert {k: c.count for k, c in github.contributors.items()} == {'A': 2}
+        assert github.set_window(None, since)
+        assert {k: c.count for k, c in github.contributors.items()} == {'A': 1, 'B': 1}
+        assert fetch.call_count == 2
+
+        github.set_window(since, since + timedelta(days=7))
+        await github.update_contributors()
+        assert {k: c.count for k, c in github.contributors.items()} == {'A': 2}
+        assert fetch.call_count == 3
+
+        assert not github.set_window(since, since + timedelta(days=1))
+        github.set_window(since, since + timedelta(days=7, hours=1))
+        assert not github.weekly_window()
+    await github.close()
+
+
+def test_projected_decode():
+    body = json.dumps([{'sha': '1', 'url': 'x', 'author': None,
+                        'commit': {'author': {'email': 'a@a', 'date': '2020-02-02T00:00:00Z',
+                                              'name': 'A'}, 'message': 'm'}}]).encode()
+    assert decode_page(body, GitHub.commit_fields) == [
+        {'sha': '1', 'author': None,
+         'commit': {'author': {'email': 'a@a', 'date': '2020-02-02T00:00:00Z'}}}]
+
+    assert parse_iso('2020-02-02T01:00:00Z') == parse_iso('2020-02-02T04:00:00+03:00')
+    assert parse_iso('2020-02-02T01:00:00Z') == datetime(2020, 2, 2, 1, tzinfo=timezone.utc)
+
+
 def test_slice_contributors(github):
     github.contributors = {str(i): Contributor(str(i), count=i)
                            for i in range(33)}
@@ -31,32 +256,315 @@ def test_slice_contributors(github):
     assert contribs[-1].count == 26
 
 
+def test_top_index():
+    store = ContributorStore(3)
+    for login, count in (('a', 5), ('b', 1), ('c', 3), ('d', 2)):
+        store.add(login, count=count)
+    assert [c.login for c in store.top.items] == ['a', 'c', 'd']
+    store.top.pop_moved()
+
+    store.add('b', count=2)
+    assert [c.login for c in store.top.items] == ['a', 'c', 'b']
+    assert store.top.pop_moved() == {'b', 'd'}
+
+    store.add('a')
+    assert store.top.pop_moved() == {'a'}
+    store.add('d', count=3)
+    assert [(c.login, c.count) for c in store.top.items] == [('a', 6), ('d', 5), ('c', 3)]
+    assert store.top_contributors(3) == store.top.items
+    assert [c.login for c in store.top_contributors(1)] == ['a']
+
+
 @pytest.mark.asyncio
 async def test_trottler_request(github, patch_session_request):
     patch_session_request.return_value = UnstableRequester(raise_fails=1,
                                                            return_value=['resp'])
-    github.attempts_max_interval = 0.1
+    github.backoff = Backoff(0.01, 0.1)
     github.attempts_count = 2
     r = Request('GET', '://somewhere')
     async with github.single_request(r) as resp:
         assert resp == ['resp']
 
     patch_session_request.return_value.raise_fails = 3
-    with pytest.raises(RuntimeError):
+    with pytest.raises(GiveUpError):
         async with github.single_request(r):
             pass
 
 
+@pytest.mark.asyncio
+async def test_retry_policy(github, patch_session_request):
+    github.backoff = Backoff(0.001, 0.01)
+    github.credentials.items[0].throttler.rate = 1000
+    requester = patch_session_request.return_value = UnstableRequester(raise_fails=1,
+                                                                       status=404)
+    with pytest.raises(ClientResponseError):
+        async with github.single_request(Request('GET', '/repos/a/b/commits')):
+            pass
+    assert requester.count_raise == 1
+
+    requester.raise_fails, requester.status = 100, 503
+    github.attempts_count = 3
+    breaker = github.pool.breaker('/repos/a/b/commits')
+    # each request uses all its attempts, the breaker counts the failed requests
+    for _ in range(breaker.threshold):
+        assert not breaker.is_open
+        with pytest.raises(GiveUpError):
+            async with github.single_request(Request('GET', '/repos/a/b/commits')):
+                pass
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        async with github.single_request(Request('GET', '/repos/a/b/commits')):
+            pass
+    assert requester.count_raise == 1 + 3 * breaker.threshold
+
+    # the breaker is by endpoint
+    requester.raise_fails = 0
+    async with github.single_request(Request('GET', '/repos/a/b/pulls')):
+        pass
+
+
+def test_backoff():
+    backoff = Backoff(1, 10)
+    assert all(0 <= backoff.delay(0) <= 1 for _ in range(50))
+    assert all(0 <= backoff.delay(10) <= 10 for _ in range(50))
+
+
+@pytest.mark.asyncio
+async def test_adaptive_throttler():
+    throttler = Throttler(interval=60, burst=5)
+    async with throttler:
+        pass
+    throttler.update({'X-RateLimit-Remaining': '4000',
+                      'X-RateLimit-Reset': str(int(time.time()) + 3600)})
+    assert throttler.rate > 1
+    assert throttler.capacity == 5
+    throttler.tokens = 5
+
+    start = time.monotonic()
+    for _ in range(5):
+        async with throttler:
+            pass
+    assert time.monotonic() - start < 0.1
+    assert throttler.remaining == 4000 and not throttler.limit_exceeded
+
+    throttler.update({'X-RateLimit-Remaining': '0',
+                      'X-RateLimit-Reset': str(int(time.time()) + 3600)})
+    assert throttler.limit_exceeded
+    assert throttler.blocked_until > time.monotonic() + 3000
+
+    throttler.update({'Retry-After': '7200'})
+    assert throttler.blocked_until > time.monotonic() + 7000
+
+
+def test_credentials_headroom(_config, tmp_path, monkeypatch):
+    auth_file = tmp_path / 'auth'
+    auth_file.write_text('# accounts\na:1\nb:2\n\n')
+    monkeypatch.setenv('GIT_WATCHER_AUTH', 'token3, a:1')
+    config = argparse.Namespace(**{**vars(_config), 'auth_file': str(auth_file)})
+    credentials = Credentials.from_config(config)
+    a, b, token = credentials.items
+    assert [c.auth for c in credentials.items] == ['a:1', 'b:2', 'token3']
+    assert token.headers == {'Authorization': 'token token3'}
+
+    reset = str(int(time.time()) + 600)
+    a.throttler.update({'X-RateLimit-Remaining': '100', 'X-RateLimit-Reset': reset})
+    b.throttler.update({'X-RateLimit-Remaining': '4000', 'X-RateLimit-Reset': reset})
+    token.throttler.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset})
+    assert credentials.choose() is b
+    assert credentials.remaining == 4100 and not credentials.limit_exceeded
+
+    b.inflight = 3950
+    assert credentials.choose() is a
+    a.throttler.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(reset) - 300)})
+    b.throttler.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset})
+    # all are exhausted, the nearest reset goes first
+    assert credentials.limit_exceeded
+    assert credentials.choose() is a
+
+
+@pytest.mark.asyncio
+async def test_session_lifecycle(github, patch_session_request):
+    patch_session_request.return_value = UnstableRequester(raise_fails=0,
+                                                           return_value=['resp'])
+    github.credentials.items[0].throttler.rate = 1000
+    async with github:
+        session = github.session
+        for _ in range(2):
+            async with github.single_request(Request('GET', '://somewhere')):
+                pass
+        assert github.session is session
+        assert not session.closed
+
+    assert github.session is None
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_conditional_request_cache(github):
+    sent_headers = []
+
+    @asynccontextmanager
+    async def single_request(req):
+        sent_headers.append(req.kwargs.get('headers', {}))
+        if 'If-None-Match' in sent_headers[-1]:
+            yield Mock(status=304, headers={})
+        else:
+            resp = Mock(status=200, headers={'ETag': '"v1"'})
+            resp.read = AsyncMock(return_value=b'[1, 2]')
+            yield resp
+
+    with patch.object(github, 'single_request', single_request):
+        first = [r async for r in github.request('GET', '://somewhere', params={'a': 1})]
+        second = [r async for r in github.request('GET', '://somewhere', params={'a': 1})]
+
+    assert first == second == [[1, 2]]
+    assert sent_headers == [{}, {'If-None-Match': '"v1"'}]
+
+
+def test_cache_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(path, max_size=10)
+    cache.put('a', CacheEntry(etag='a', data=[1], size=4))
+    cache.put('b', CacheEntry(etag='b', data=[2], size=4))
+    cache.get('a')
+    cache.put('c', CacheEntry(etag='c', data=[3], size=4))
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.size == 8
+
+    cache.save()
+    restored = ResponseCache(path, max_size=10)
+    assert restored.get('c') == CacheEntry(etag='c', data=[3], size=4)
+    assert restored.size == 8
+
+
+@pytest.fixture()
+async def graphql_server():
+    async def handler(request):
+        body = await request.json()
+        variables = body['variables']
+        if 'history' in body['query']:
+            after = variables.get('after')
+            nodes = [{'oid': '1', 'author': {'email': 'a@a', 'date': '2020-02-02T00:00:00Z',
+                                             'user': {'login': 'A'}}},
+                     {'oid': '2', 'author': {'email': 'b@b', 'date': '2020-02-02T00:00:00Z',
+                                             'user': None}}]
+            history = {'pageInfo': {'hasNextPage': not after, 'endCursor': 'c1'},
+                       'nodes': nodes[1:] if after else nodes[:1]}
+            data = {'repository': {'ref': {'target': {'history': history}}}}
+        else:
+            data = {name: {'issueCount': len(q)} for name, q in variables.items()}
+        return web.json_response({'data': data})
+
+    app = web.Application()
+    app.router.add_post('/graphql', handler)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_graphql_provider(_config, graphql_server):
+    provider = GitHubGraphQL(_config)
+    provider.since = provider.until = provider.config.since = provider.config.until = None
+    provider.base_url = str(graphql_server.make_url('/graphql'))
+    provider.credentials.items[0].throttler = Throttler(interval=0.01)
+    async with provider:
+        await provider.update_pulls_info()
+        await provider.update_contributors()
+
+    search = 'repo:TestAuthor/testProject is:pr base:master draft:false is:open'
+    assert provider.pulls_info['opened'] == len(search)
+    assert provider.pulls_info['closed'] == len(search) + 2
+    assert {k: c.count for k, c in provider.contributors.items()} == {'A': 1, 'b@b': 1}
+
+
+def git(path, *args, date='2020-02-02T00:00:00+00:00', email='a@a'):
+    env = {**os.environ, 'GIT_AUTHOR_DATE': date, 'GIT_COMMITTER_DATE': date,
+           'GIT_AUTHOR_NAME': 'A', 'GIT_AUTHOR_EMAIL': email,
+           'GIT_COMMITTER_NAME': 'A', 'GIT_COMMITTER_EMAIL': email}
+    subprocess.run(['git', '-C', str(path), *args], env=env, check=True, capture_output=True)
+
+
+@pytest.mark.asyncio
+async def test_local_provider(_config, tmp_path):
+    git(tmp_path, 'init', '-q', '-b', 'master')
+    git(tmp_path, 'commit', '-q', '--allow-empty', '-m', '1')
+    git(tmp_path, 'commit', '-q', '--allow-empty', '-m', '2', email='b@b')
+
+    _config.mirror = str(tmp_path)
+    provider = LocalGit(_config)
+    provider.config.since = provider.config.until = None
+    await provider.update_contributors()
+    assert {k: c.count for k, c in provider.contributors.items()} == {'a@a': 1, 'b@b': 1}
+
+    git(tmp_path, 'commit', '-q', '--allow-empty', '-m', '3')
+    with patch.object(provider, 'log', wraps=provider.log) as log:
+        await provider.update_contributors()
+    assert log.call_args[0][0].endswith('..' + provider.watermark.sha)
+    assert {k: c.count for k, c in provider.contributors.items()} == {'a@a': 2, 'b@b': 1}
+
+    async def failed_log(*args):
+        yield {'sha': '4', 'email': 'b@b', 'date': '2020-02-02T00:00:00Z'}
+        raise RuntimeError('git log: failed')
+
+    git(tmp_path, 'commit', '-q', '--allow-empty', '-m', '4', email='b@b')
+    watermark = provider.watermark
+    with patch.object(provider, 'log', failed_log), pytest.raises(RuntimeError):
+        await provider.update_contributors()
+    assert provider.watermark is watermark
+    assert {k: c.count for k, c in provider.contributors.items()} == {'a@a': 2, 'b@b': 1}
+    await provider.update_contributors()
+    assert {k: c.count for k, c in provider.contributors.items()} == {'a@a': 2, 'b@b': 2}
+
+    git(tmp_path, 'reset', '-q', '--hard', 'HEAD~3')
+    await provider.update_contributors()
+    assert {k: c.count for k, c in provider.contributors.items()} == {'a@a': 1}
+
+    with pytest.raises(RuntimeError, match='unknown'):
+        async for _ in provider.log('unknown'):
+            pass
+    # the clone is read anyway, a push is not counted twice by its event
+    assert not provider.apply_event('push', {'ref': 'refs/heads/master', 'commits': []})
+
+
 def test_makeing_table():
-    pass
+    contributor = Contributor('login', count=3, email='a@a')
+    assert contributor == 'login'
+    assert contributor == Contributor('login', 3, 'a@a')
+    assert not hasattr(contributor, '__dict__')
+
+    table = str(Table(Contributor, [contributor, Contributor('other', 1)]))
+    assert table.splitlines() == ['LOGIN    COUNT    ',
+                                  'login    3        ',
+                                  'other    1        ']
 
 
 def test_log_level_switching():
     pass
 
 
-def test_pagination_requests():
-    pass
+@pytest.mark.asyncio
+async def test_pagination_requests(github):
+    link = ('<https://api.github.com/repositories/1/commits?per_page=1&page=2>; rel="next", '
+            '<https://api.github.com/repositories/1/commits?per_page=1&page=5>; rel="last"')
+    pages = []
+
+    @asynccontextmanager
+    async def single_request(req):
+        page = int(req.kwargs['params'].get('page', 1))
+        pages.append(page)
+        resp = Mock(status=200, headers={'Link': link if page == 1 else ''})
+        resp.read = AsyncMock(return_value=json.dumps([page]).encode())
+        yield resp
+
+    github.concurrency = 2
+    with patch.object(github, 'single_request', single_request):
+        results = [r async for r in github.request('GET', '://somewhere', params={})]
+
+    assert pages[0] == 1
+    assert sorted(pages) == [1, 2, 3, 4, 5]
+    assert sorted(sum(results, [])) == [1, 2, 3, 4, 5]
 
 
 def test_load_pull_requests_info():
@@ -65,3 +573,72 @@ def test_load_pull_requests_info():
 
 def test_load_issues_info():
     pass
+
+
+@pytest.mark.asyncio
+async def test_pages_of_fake_api(_config):
+    from benchmarks.fake_github import FakeGitHub, item
+
+    fake = FakeGitHub(pages=3, per_page=10)
+    github = GitHub(argparse.Namespace(**{**vars(_config), 'metrics': True}))
+    github.base_url = await fake.start()
+    try:
+        await github.update_pulls_info()
+        assert github.pulls_info == {'name': 'Pulls', 'closed': 17, 'opened': 8, 'old_opened': 8}
+        # the pulls updated since the last poll, the newest go first
+        reopened = {**item(1, pull=True), 'state': 'open', 'updated_at': '2030-01-01T00:00:00Z'}
+        fake.data['pulls'][0] = json.dumps([reopened, item(0, pull=True)]).encode()
+        await github.update_pulls_info()
+        assert github.pulls_info == {'name': 'Pulls', 'closed': 16, 'opened': 9, 'old_opened': 9}
+        assert github.pull_states.cursor == datetime(2030, 1, 1, tzinfo=timezone.utc)
+        assert fake.responses == {200: 4}
+        await github.update_pulls_info()
+        assert fake.responses == {200: 4, 304: 1}
+
+        metrics = github.metrics.asdict()
+        assert metrics['pages_total'] == [{'labels': {'endpoint': '/pulls'}, 'value': 5}]
+        assert metrics['not_modified_total'][0]['value'] == 1
+        assert metrics['request_seconds'][0]['count'] == 5
+    finally:
+        await github.close()
+        await fake.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+async def test_parse_workers(_config, executor):
+    from benchmarks.fake_github import FakeGitHub
+
+    fake = FakeGitHub(pages=2, per_page=10)
+    results = []
+    for workers in (0, 2):
+        github = GitHub(argparse.Namespace(**{**vars(_config), 'parse_workers': workers,
+                                              'parse_executor': executor}))
+        github.pool.offload_size = 0
+        github.base_url = await fake.start()
+        try:
+            await github.update_issues_info()
+            results.append(github.issues_info)
+            assert (github.pool.executor is not None) == bool(workers)
+        finally:
+            await github.close()
+            await fake.close()
+        assert github.pool.executor is None
+    assert results[0] == results[1]
+
+
+@pytest.mark.asyncio
+async def test_close_parse_workers(_config):
+    pool = Pool(argparse.Namespace(**{**vars(_config), 'parse_workers': 1}))
+    pool.offload_size = 0
+    await pool.decode(b'[]')
+    released = threading.Event()
+    pool.executor.submit(released.wait)
+    # the page waits behind the busy worker and is cancelled by close
+    decoding = asyncio.ensure_future(pool.decode(b'[]'))
+    await asyncio.sleep(0)
+    await pool.close()
+    released.set()
+    with pytest.raises(asyncio.CancelledError):
+        await decoding
+    assert not pool.decoding
@@ -0,0 +1,32 @@
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+# microseconds of import of the package and config, ~90 ms by now and ~250 ms
+# with `pkg_resources`
+BUDGET = 150_000
+
+
+def run(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True,
+                          check=True)
+
+
+def test_cli_path_is_lazy():
+    code = ('import sys, git_watcher.config, git_watcher.source; '
+            'print(*[m for m in ("aiohttp", "pkg_resources", "git_watcher.source.github", '
+            '"git_watcher.watcher") if m in sys.modules])')
+    assert run('-c', code).stdout.strip() == ''
+
+
+def test_import_time():
+    stderr = run('-X', 'importtime', '-c', 'import git_watcher.config').stderr
+    # lines are `import time: self | cumulative | name`, nested names are indented
+    times = {name: int(us) for us, name in re.findall(r'\| +(\d+) \| (\S+)$', stderr, re.M)}
+    assert 0 < times['git_watcher.config'] < BUDGET, stderr
+
+
+def test_help():
+    assert '--provider {github,graphql,local}' in run('-m', 'git_watcher', '--help').stdout
@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+from aiohttp import ClientPayloadError
+
+from git_watcher.objects import Contributor, Destination, ItemStates, Watermark
+from git_watcher.watcher import Watcher, Schedule
+
+
+@pytest.mark.asyncio
+async def test_independent_schedules(_config):
+    watcher = Watcher(_config)
+    calls = {'fast': 0, 'slow': 0}
+    running = set()
+
+    def updater(name, duration):
+        async def update():
+            assert name not in running
+            running.add(name)
+            await asyncio.sleep(duration)
+            running.discard(name)
+            calls[name] += 1
+        return update
+
+    watcher.schedules = [Schedule('fast', updater('fast', 0.01), 0.01),
+                         Schedule('slow', updater('slow', 0.2), 0.01)]
+    task = asyncio.ensure_future(watcher.update())
+    await asyncio.sleep(0.1)
+    assert watcher.first_boot
+    await asyncio.sleep(0.2)
+    task.cancel()
+    await watcher.pool.close()
+
+    assert not watcher.first_boot
+    assert calls['slow'] == 1
+    assert calls['fast'] > 5
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh(_config):
+    watcher = Watcher(argparse.Namespace(**{**vars(_config), 'metrics': True}))
+    errors = [asyncio.TimeoutError(), ValueError('bad JSON'), ClientPayloadError()]
+
+    async def update():
+        if errors:
+            raise errors.pop()
+
+    schedule = Schedule('flaky', update, 0.01)
+    watcher.schedules = [schedule]
+    task = asyncio.ensure_future(watcher.refresh(schedule))
+    await asyncio.sleep(0.1)
+    assert not task.done()
+    assert 'flaky' in watcher.refreshed
+    assert watcher.pool.metrics.counters[('refresh_errors_total', (('metric', 'flaky'),))] == 3
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await watcher.pool.close()
+
+
+def test_schedule_jitter():
+    schedule = Schedule('any', None, 10, jitter=0.5)
+    assert all(10 <= schedule.delay() <= 15 for _ in range(100))
+
+
+@pytest.mark.asyncio
+async def test_many_repositories(_config):
+    config = argparse.Namespace(**vars(_config))
+    config.dests = [Destination('owner', f'repo{i}') for i in range(3)]
+    config.page_size = 2
+    watcher = Watcher(config)
+    assert len(watcher.schedules) == 9
+    assert all(p.pool is watcher.pool for p in watcher.providers)
+    assert len({id(p.credentials) for p in watcher.providers}) == 1
+
+    for i, provider in enumerate(watcher.providers):
+        provider.contributors = {'a': Contributor('a', count=i + 1),
+                                 f'only{i}': Contributor(f'only{i}', count=5)}
+        provider.pulls_info.update(opened=i, closed=1, old_opened=0)
+        provider.update_contributors = AsyncMock()
+        await watcher.update_contributors(provider)
+
+    assert [(c.login, c.count) for c in watcher.contributors][:2] == [('a', 6), ('only0', 5)]
+
+    rows = watcher.statistic_page(1)
+    assert rows[0] == {'name': 'All pulls', 'opened': 3, 'closed': 3, 'old_opened': 0}
+    assert rows[1] == {'name': 'All issues'}
+    assert [r['name'] for r in rows[2:]] == ['owner/repo2 pulls', 'owner/repo2 issues']
+    assert 'page' in watcher.frame().splitlines()[0]
+
+
+def test_warm_restart(_config, tmp_path):
+    config = argparse.Namespace(**vars(_config))
+    config.state_file = str(tmp_path / 'state.db')
+    watcher = Watcher(config)
+    provider = watcher.provider
+    provider.contributors = {'a': Contributor('a', count=3, email='a@a')}
+    provider.pulls_info.update(opened=1, closed=2, old_opened=0)
+    provider.watermark = Watermark('sha', datetime(2020, 2, 2, tzinfo=timezone.utc), {'sha'})
+    provider.pull_states = ItemStates(provider.window)
+    provider.pull_states.set(5, True, 1580000000.0)
+    provider.pull_states.cursor = datetime(2020, 2, 3, tzinfo=timezone.utc)
+    watcher.save()
+    watcher.state.close()
+
+    restarted = Watcher(config)
+    restarted.restore()
+    assert [(c.login, c.count, c.email) for c in restarted.contributors] == [('a', 3, 'a@a')]
+    assert restarted.provider.pulls_info['closed'] == 2
+    watermark = restarted.provider.watermark
+    assert (watermark.sha, watermark.seen) == ('sha', {'sha'})
+    assert watermark.window == restarted.provider.window
+    pull_states = restarted.provider.pull_states
+    assert pull_states.items == {5: (True, 1580000000.0)} and pull_states.opened == [1580000000.0]
+    assert pull_states.cursor == provider.pull_states.cursor
+    assert restarted.provider.item_states(pull_states) is pull_states
+    restarted.state.close()